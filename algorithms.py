@@ -1,46 +1,94 @@
+import heapq
+import multiprocessing
+import os
+import pickle
 import random
 
 from utils import *
+from profiling import profiled
 
+try:
+    import numpy as np
+except ImportError: # vectorised conflict counting is optional
+    np = None
+
+
+def AC3(csp, queue = None, stats = None):
+    ''' Arc consistency. Реализует алгоритм поддержания ...
+
+        Last found support of every value is kept in csp.supports (AC-2001
+        residues) and checked first, before scanning the domain of Xj.
+        CSP subclasses can skip the scan completely by overriding
+        CSP.has_support for their constraints. Pass SearchStats as stats
+        to count revisions, checks and prunes.
+    '''
+    supports = csp.supports
+
+    def supported(Xi, x, Xj):
+        answer = csp.has_support(Xi, x, Xj)
+        if answer is not None:
+            return answer
+        key = (id(Xi), x, id(Xj))
+        residue = supports.get(key)
+        if residue is not None and residue in Xj.curr_domain:
+            return True
+        for y in Xj.curr_domain:
+            if csp.constraints(Xi, x, Xj, y):
+                supports[key] = y
+                return True
+        return False
 
-def AC3(csp, queue = None):
-    ''' Arc consistency. Реализует алгоритм поддержания ...'''
     def revise(Xi, Xj):
         revised = False
         for x in Xi.curr_domain:
-            if every(lambda y: not csp.constraints(Xi, x, Xj, y),
-                  [y for y in Xj.curr_domain]):
-                Xi.curr_domain.remove(x)
+            if not supported(Xi, x, Xj):
+                csp.prune(Xi, x)
                 revised = True
         return revised
 
     if queue is None:
         queue = [(Xi, Xk) for Xi in csp.variables for Xk in Xi.neighbors]
-    while queue:
-        (Xi, Xj) = queue.pop()
-        if revise(Xi, Xj):
-            if len(Xi.curr_domain) == 0: return False
-            for Xk in Xi.neighbors:
-                queue.append((Xk, Xi))
+    pending = {(id(Xi), id(Xj)) for Xi, Xj in queue}
+    with profiled(csp, stats):
+        while queue:
+            (Xi, Xj) = queue.pop()
+            pending.discard((id(Xi), id(Xj)))
+            if stats is not None:
+                stats.revisions += 1
+            if revise(Xi, Xj):
+                if len(Xi.curr_domain) == 0: return False
+                for Xk in Xi.neighbors:
+                    if Xk is not Xj and (id(Xk), id(Xi)) not in pending:
+                        pending.add((id(Xk), id(Xi)))
+                        queue.append((Xk, Xi))
     return True
 
 ## Variable ordering heuristics
 def first_unassigned_variable(csp):
-    assert([v for v in csp.variables if not v.isassigned()]) # FIXME: will be removed
     for v in csp.variables:
         if not v.isassigned(): return v
+    return None
 
 def minimum_remaining_value(csp):
-    pass
+    ''' Unassigned variable with the smallest current domain; ties are broken
+        in favour of variable with more unassigned neighbors (degree heuristic).
+
+        [According to: AIMA, 3rd, p.216]
+    '''
+    return csp.attach(RemainingValues).top()
 
 
 ## Value ordering heuristics
 def least_constraining_value(var, csp):
-    return sorted(var.curr_domain,
-                  key=lambda Vi: csp.conflicts(var, Vi))
+    values, counts = list(var.curr_domain), csp.conflict_counts(var)
+    if np is not None and isinstance(counts, np.ndarray):
+        order = np.argsort(counts, kind='stable')
+    else:
+        order = sorted(range(len(values)), key=counts.__getitem__)
+    return [values[i] for i in order]
 
 
-def forward_checking(X, csp, removed):
+def forward_checking(X, csp):
     ''' Simplest way of inference. Whenever X is assigned, function establishes
         arc consistency for it: for each unassigned variable Y connected to X
         by constraint, delete from Y.curr_domain values inconsistent with X.value.
@@ -51,90 +99,422 @@ def forward_checking(X, csp, removed):
         if Y.isunassigned():
             for y in Y.curr_domain:
                 if not csp.constraints(X, X.curr_value, Y, y):
-                    Y.curr_domain.remove(y)
-                    removed.append((Y, y))
+                    csp.prune(Y, y)
             if not Y.curr_domain:
                 return False
     return True
 
 
+def maintain_arc_consistency(X, csp):
+    ''' MAC inference: runs AC3 starting from arcs (Y, X) of unassigned neighbors.
+
+        [According to: AIMA, 3rd, p.218]
+    '''
+    return AC3(csp, [(Y, X) for Y in X.neighbors if Y.isunassigned()])
+
+
 def BacktrackingSearch(csp,
                        select_unassigned_variable=first_unassigned_variable,
                        order_domain_values=least_constraining_value,
-                       inference=forward_checking):
+                       inference=forward_checking,
+                       stats=None):
     ''' Backtracking algorithm for CSP. Variable selection, domain values
-        ordering and inference algorithms could be tuned.
+        ordering and inference algorithms could be tuned. Pass SearchStats
+        as stats to count nodes, backtracks, checks, prunes and to time
+        the heuristics.
 
         [According to: AIMA, 3rd, p.214]
     '''
+    def expand():
+        ''' Frame of the next unassigned variable, None if all are assigned '''
+        var = select_unassigned_variable(csp)
+        if var is None:
+            return None
+        if stats is not None:
+            stats.node()
+        return var, iter(order_domain_values(var, csp))
+
     def Backtrack():
-        if len(csp.assignment) == len(csp.variables):
+        # explicit stack of (variable, its remaining values) instead of
+        # recursion, so depth isn't limited by the number of variables;
+        # prunes of every assigned variable are undone by the trail
+        frame = expand()
+        if frame is None: # all variables are assigned
             return True
-        var = select_unassigned_variable(csp)
-        for value in order_domain_values(var, csp):
-            if not csp.conflicts(var, value):
+        stack = [frame]
+        while stack:
+            var, values = stack[-1]
+            if var.isassigned(): # the value failed deeper in the search
+                csp.backtrack()
+                var.unassign()
+            for value in values:
+                if csp.conflicts(var, value):
+                    continue
                 var.assign(value)
-                removed = [(var, x) for x in var.curr_domain if x != value]
-                var.curr_domain = [value]
-                if inference(var, csp, removed):
-                    result = Backtrack()
-                    if result:
-                        return True
-                csp.restoreall(removed)
-            var.unassign()
+                csp.checkpoint()
+                for x in var.curr_domain:
+                    if x != value:
+                        csp.prune(var, x)
+                if inference(var, csp):
+                    break
+                csp.backtrack()
+                var.unassign()
+            else:
+                stack.pop()
+                if stats is not None:
+                    stats.backtracks += 1
+                continue
+            frame = expand()
+            if frame is None:
+                return True
+            stack.append(frame)
         return False
 
-    return Backtrack()
+    if stats is not None:
+        select_unassigned_variable = stats.timed('select_unassigned_variable',
+                                                 select_unassigned_variable)
+        order_domain_values = stats.timed('order_domain_values', order_domain_values)
+        inference = stats.timed('inference', inference)
+    with csp.temporary_watchers(), profiled(csp, stats):
+        return Backtrack()
+
+
+## Incrementally maintained structures
+class Watcher:
+    ''' Base class for structures which are kept up to date along with CSP
+        state. Instances are created by CSP.attach and notified by variables.
+    '''
+    def __init__(self, csp):
+        self.csp = csp
+
+    def value_changed(self, var, previous):
+        pass
+
+    def domain_changed(self, var):
+        pass
+
+
+class ConflictTable(Watcher):
+    ''' Number of conflicts for each assigned variable and set of violated ones.
+        Assignment of X updates only X and variables which have X as neighbor,
+        so it costs O(deg(X)) instead of full rescan in CSP.violation_list.
+    '''
+    def __init__(self, csp):
+        super().__init__(csp)
+        self.counts = {} # id(var) -> number of conflicts of var.curr_value
+        self.violated = IndexedSet()
+        self.dependents = {} # id(X) -> variables having X as neighbor
+        for Y in csp.variables:
+            for X in Y.neighbors:
+                self.dependents.setdefault(id(X), []).append(Y)
+        for X in csp.variables:
+            if X.isassigned():
+                self.recount(X)
+
+    def recount(self, X):
+        self.counts[id(X)] = self.csp.conflicts(X, X.curr_value)
+        if self.counts[id(X)]:
+            self.violated.add(X)
+        else:
+            self.violated.discard(X)
+
+    def value_changed(self, X, previous):
+        constraints = self.csp.constraints
+        value = X.curr_value
+        for Y in self.dependents.get(id(X), ()):
+            if Y.isunassigned():
+                continue
+            delta = 0
+            if previous is not None and not constraints(Y, Y.curr_value, X, previous):
+                delta -= 1
+            if value is not None and not constraints(Y, Y.curr_value, X, value):
+                delta += 1
+            if delta:
+                self.counts[id(Y)] += delta
+                if self.counts[id(Y)]:
+                    self.violated.add(Y)
+                else:
+                    self.violated.discard(Y)
+        if value is None:
+            self.counts.pop(id(X), None)
+            self.violated.discard(X)
+        else:
+            self.recount(X)
+
+
+class RemainingValues(Watcher):
+    ''' Heap of unassigned variables keyed by (domain size, -degree), degree
+        is the number of unassigned neighbors and is kept up to date on
+        assignments. Entries are pushed on every change and outdated ones
+        are dropped lazily when they reach the top, so updates cost
+        O(log V) (O(deg(X) log V) for assignment of X) and top() is
+        amortized O(1).
+    '''
+    def __init__(self, csp):
+        super().__init__(csp)
+        self.order = {id(v): i for i, v in enumerate(csp.variables)}
+        self.dependents = {} # id(X) -> variables having X as neighbor
+        for Y in csp.variables:
+            for X in Y.neighbors:
+                self.dependents.setdefault(id(X), []).append(Y)
+        self.degree = {id(v): sum(1 for Y in v.neighbors if Y.isunassigned())
+                       for v in csp.variables}
+        self.rebuild()
+
+    def rebuild(self):
+        self.heap = [self.entry(v) for v in self.csp.variables if v.isunassigned()]
+        heapq.heapify(self.heap)
+
+    def entry(self, var):
+        return len(var.curr_domain), -self.degree[id(var)], self.order[id(var)], var
+
+    def push(self, var):
+        if var.isunassigned():
+            heapq.heappush(self.heap, self.entry(var))
+            if len(self.heap) > 4 * len(self.order) + 64:
+                self.rebuild()
+
+    def value_changed(self, var, previous):
+        delta = (previous is not None) - var.isassigned() # -1 assigned, +1 unassigned
+        if delta:
+            for Y in self.dependents.get(id(var), ()):
+                self.degree[id(Y)] += delta
+                self.push(Y)
+        self.push(var)
 
+    def domain_changed(self, var):
+        self.push(var)
+
+    def top(self):
+        heap = self.heap
+        while heap:
+            size, degree, _, var = heap[0]
+            if var.isunassigned() and len(var.curr_domain) == size and \
+                    -degree == self.degree[id(var)]:
+                return var
+            heapq.heappop(heap)
+        return None
+
+
+class WeightTable(Watcher):
+    ''' Soft constraints objective kept up to date on assignments: running
+        sum of |csp.weight(var)| and max-heap of weights with lazy removal of
+        outdated entries, so both are updated in O(log V) per assignment.
+    '''
+    def __init__(self, csp):
+        super().__init__(csp)
+        self.order = {id(v): i for i, v in enumerate(csp.variables)}
+        self.weights = [csp.weight(v) for v in csp.variables]
+        self.total = sum(map(abs, self.weights))
+        self.rebuild()
 
-def argmin_conflicts(csp, var):
-    return argmin(lambda x: csp.conflicts(var, x),
-                  var.curr_domain, random.choice)
+    def rebuild(self):
+        self.heap = [(-w, i) for i, w in enumerate(self.weights)]
+        heapq.heapify(self.heap)
+
+    def value_changed(self, var, previous):
+        i, weight = self.order[id(var)], self.csp.weight(var)
+        self.total += abs(weight) - abs(self.weights[i])
+        self.weights[i] = weight
+        heapq.heappush(self.heap, (-weight, i))
+        if len(self.heap) > 4 * len(self.weights) + 64:
+            self.rebuild()
+
+    def heaviest(self):
+        ''' Variable with the largest weight (the first one among equal),
+            None if CSP has no variables '''
+        heap = self.heap
+        while heap and -heap[0][0] != self.weights[heap[0][1]]:
+            heapq.heappop(heap)
+        return self.csp.variables[heap[0][1]] if heap else None
+
+
+def argmin_conflicts(csp, var, rng=random):
+    values, counts = list(var.curr_domain), csp.conflict_counts(var)
+    if np is not None and isinstance(counts, np.ndarray):
+        ties = np.flatnonzero(counts == counts.min())
+    else:
+        least = min(counts)
+        ties = [i for i, c in enumerate(counts) if c == least]
+    return values[rng.choice(ties)]
 
 def most_weight_variable(csp, vars):
-    return max(csp.weight_list().items(), key=itemgetter(1))[0]
-
-
-def min_conflicts(csp, max_steps=10000):
-    def argmin_conflicts(var):
-        return argmin(lambda x: csp.conflicts(var, x),
-                      var.curr_domain, random.choice)
-
-    # initial assignment (probably unfeasible)
-    for var in csp.variables:
-        var.assign(argmin_conflicts(var))
-    # local search
-    best_value = INFINITY
-    best_assignment = None
-    for _ in range(max_steps):
-        violations = csp.violation_list()
-        if not violations: # all constrains satisfied
-            return {v.name:v.curr_value for v in csp.variables}
-        var = random.choice(violations)
-        val = argmin_conflicts(var)
-        var.assign(val)
-    return best_assignment
+    return csp.attach(WeightTable).heaviest()
 
 
-def iterative_forward_search(csp, max_steps=5000):
-    def argmin_conflicts(var):
-        return argmin(lambda x: csp.conflicts(var, x),
-                      var.curr_domain, random.choice)
+def min_conflicts(csp, max_steps=10000, stats=None, rng=None):
+    ''' rng is random.Random instance making the run reproducible,
+        global random module is used by default '''
+    if rng is None:
+        rng = random
+    choose_value = argmin_conflicts
+    if stats is not None:
+        choose_value = stats.timed('argmin_conflicts', choose_value)
+    with csp.temporary_watchers(), profiled(csp, stats):
+        table = csp.attach(ConflictTable)
+        # initial assignment (probably unfeasible)
+        for var in csp.variables:
+            var.assign(choose_value(csp, var, rng))
+        # local search
+        for _ in range(max_steps):
+            if not table.violated: # all constrains satisfied
+                return {str(v):v.curr_value for v in csp.variables}
+            if stats is not None:
+                stats.step()
+            var = rng.choice(table.violated)
+            var.assign(choose_value(csp, var, rng))
+    return None
 
-    def most_weight_variable(vars):
-        from operator import itemgetter
-        return max(csp.weight_list().items(), key=itemgetter(1))[0]
 
+def iterative_forward_search(csp, max_steps=5000, stats=None, rng=None):
+    if rng is None:
+        rng = random
+    choose_variable, choose_value, estimate = most_weight_variable, argmin_conflicts, csp.preferences
+    if stats is not None:
+        choose_variable = stats.timed('most_weight_variable', choose_variable)
+        choose_value = stats.timed('argmin_conflicts', choose_value)
+        estimate = stats.timed('preferences', estimate)
     best_value, best_assignment = INFINITY, csp.infer_assignment()
-    for _ in range(max_steps):
-        X = most_weight_variable(csp.variables)
-        a = argmin_conflicts(X)
-        X.assign(a)
-        violations = csp.violation_list()
-        if not violations:
-            estimate = csp.preferences()
-            if estimate < best_value:
-                print(estimate)
-                best_value, best_assignment = estimate, csp.infer_assignment()
-        for Y in violations: Y.unassign()
-    return best_assignment
\ No newline at end of file
+    with csp.temporary_watchers(), profiled(csp, stats):
+        table = csp.attach(ConflictTable)
+        for _ in range(max_steps):
+            if stats is not None:
+                stats.step()
+            X = choose_variable(csp, csp.variables)
+            if X is None: # nothing to plan
+                break
+            X.assign(choose_value(csp, X, rng))
+            if not table.violated:
+                value = estimate()
+                if value < best_value:
+                    best_value, best_assignment = value, csp.infer_assignment()
+                    if stats is not None:
+                        stats.best = value
+            for Y in list(table.violated): Y.unassign()
+    return best_assignment
+
+
+def least_change_value(csp, var, original, rng=random):
+    ''' Value of var with the least conflicts, ties are broken in favour of
+        values closest to original one (see CSP.change_cost) '''
+    values, counts = list(var.curr_domain), csp.conflict_counts(var)
+    least = min(counts)
+    ties = [v for v, c in zip(values, counts) if c == least]
+    if original is not None:
+        costs = [csp.change_cost(var, original, v) for v in ties]
+        ties = [v for v, c in zip(ties, costs) if c == min(costs)]
+    return rng.choice(ties)
+
+
+def repair(csp, assignment, forbidden, max_steps=10000, stats=None, rng=None):
+    ''' Warm start of min_conflicts after disruption (lecturer is ill, room
+        is closed). assignment is {str(variable): value} as returned by
+        min_conflicts or TimetablePlanner2.infer_assignment, forbidden is
+        {str(variable): values} which can't be used any more, they are
+        pruned from domains permanently.
+
+        Only variables whose values became forbidden are unassigned and
+        placed again. Their neighbours are deliberately kept assigned:
+        local search moves only violated variables, so the conflict
+        neighbourhood is reopened only as far as conflicts spread, and the
+        rest of the timetable stays as it was. Every variable prefers
+        values closest to its original one. Returns assignment like
+        min_conflicts or None if conflicts remain after max_steps. If
+        forbidden leaves some variable without values None is returned
+        before csp is changed.
+    '''
+    if rng is None:
+        rng = random
+    by_name = {str(v): v for v in csp.variables}
+    for name, values in forbidden.items():
+        values = set(values)
+        if all(value in values for value in by_name[name].curr_domain):
+            return None
+    csp.load_assignment(assignment)
+    affected = []
+    for name, values in forbidden.items():
+        var = by_name[name]
+        for value in values:
+            if value in var.curr_domain:
+                csp.prune(var, value)
+        if var.isassigned() and var.curr_value not in var.curr_domain:
+            var.unassign()
+            affected.append(var)
+    choose_value = least_change_value
+    if stats is not None:
+        choose_value = stats.timed('least_change_value', choose_value)
+    with csp.temporary_watchers(), profiled(csp, stats):
+        table = csp.attach(ConflictTable)
+        # the most constrained variables are placed first
+        for var in sorted(affected, key=lambda v: len(v.curr_domain)):
+            var.assign(choose_value(csp, var, assignment.get(str(var)), rng))
+        for var in csp.variables:
+            if var.isunassigned(): # absent in assignment
+                var.assign(choose_value(csp, var, None, rng))
+        for _ in range(max_steps):
+            if not table.violated:
+                return {str(v): v.curr_value for v in csp.variables}
+            if stats is not None:
+                stats.step()
+            var = rng.choice(table.violated)
+            var.assign(choose_value(csp, var, assignment.get(str(var)), rng))
+    return None
+
+
+def seeded_run(payload, solver, seed, kwargs):
+    csp = pickle.loads(payload)
+    if hasattr(csp, 'to_csp'): # CompactCSP
+        csp = csp.to_csp()
+    return seed, solver(csp, rng=random.Random(seed), **kwargs)
+
+
+def seeded_task(task):
+    return seeded_run(*task)
+
+
+def multistart_search(csp, solver=min_conflicts, seeds=None, first_feasible=True,
+                      max_workers=None, compact=False, **kwargs):
+    ''' Runs independent copies of randomized solver (min_conflicts,
+        iterative_forward_search) with different seeds in process pool.
+        Returns the first feasible assignment found, or with first_feasible=False
+        waits for all runs and returns the one with the least csp.preferences().
+        The winning assignment is loaded into csp; None is returned if no run
+        succeeded. Extra keyword arguments are passed to the solver.
+
+        Every run gets its own random.Random(seed), so solver(csp, rng=random.Random(seed))
+        replays it exactly. Result of first_feasible=False doesn't depend on
+        order in which runs finish. With first_feasible=True runs still going
+        on are stopped by terminating worker processes.
+
+        With compact=True workers get CompactCSP instead of pickled variables.
+        It only keeps constraints (by kinds or tables of allowed pairs), so solver must not depend on
+        methods of CSP subclass (min_conflicts doesn't, iterative_forward_search does).
+    '''
+    if seeds is None:
+        seeds = range(os.cpu_count() or 1)
+    if compact:
+        from compact import CompactCSP
+        payload = pickle.dumps(CompactCSP(csp))
+    else:
+        # pickled once and right now: pool pickles arguments in background
+        # thread, while csp is changed by load_assignment below
+        payload = pickle.dumps(csp)
+    best, best_key = None, None
+    # leaving the block terminates workers, so runs still going on after
+    # the first feasible result don't keep burning CPU
+    with multiprocessing.Pool(max_workers) as pool:
+        tasks = [(payload, solver, seed, kwargs) for seed in seeds]
+        for seed, assignment in pool.imap_unordered(seeded_task, tasks):
+            if not assignment:
+                continue
+            csp.load_assignment(assignment)
+            if not csp.isfeasible():
+                continue
+            if first_feasible:
+                return assignment
+            key = (csp.preferences(), seed)
+            if best_key is None or key < best_key:
+                best, best_key = assignment, key
+    if best is not None:
+        csp.load_assignment(best)
+    return best
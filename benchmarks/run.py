@@ -0,0 +1,216 @@
+""" Benchmarks of CSP solvers and timetable planners
+
+    python -m benchmarks.run                  # run and print results
+    python -m benchmarks.run -k sudoku        # only cases containing "sudoku"
+    python -m benchmarks.run --save           # store results as baseline
+    python -m benchmarks.run --compare        # compare with baseline, exit 1 on regression
+
+Every case is run with seeds 0..repeats-1. Reported are median wall
+time, peak memory of traced allocations (separate run with tracemalloc,
+so it doesn't slow down the timed ones), mean constraint checks and
+nodes/steps from SearchStats and the share of successful runs. Checks
+don't depend on the machine, so they are the first thing to look at
+when times differ from the baseline. Times in baseline.json are of the
+machine which saved it, re-save it before comparing on another one.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from algorithms import *
+from csp import Sudoku, MapColoring
+from profiling import SearchStats
+from synthetic import SyntheticUniversity
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+SUDOKU = {
+    'easy': '..3.2.6..9..3.5..1..18.64....81.29..7.......8..67.82....26.95..8..2.3..9..5.1.3..',
+    'hard': '4173698.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......',
+    'inkala': '8..........36......7..9.2...5...7.......457.....1...3...1....68..85...1..9....4..',
+}
+
+CASES = [] # (name, setup); setup(seed) -> run(stats) -> success
+
+
+def case(name, setup, *args):
+    CASES.append((name, lambda seed: setup(seed, *args)))
+
+
+def australia():
+    return MapColoring(list('RGB'), {
+        'SA':  ['WA', 'NT', 'Q', 'NSW', 'V'], 'WA': ['SA', 'NT'],
+        'Q':   ['SA', 'NT', 'NSW'], 'NT': ['SA', 'WA', 'Q'],
+        'NSW': ['SA', 'Q', 'V'], 'V': ['SA', 'NSW'], 'T': []
+    })
+
+
+def king_graph(n, colors='RGBY'):
+    ''' n x n board where cells touching by side or corner are neighbors,
+        needs 4 colors, coloring with 4 colors is unique up to permutation
+        and too hard for min_conflicts '''
+    neighbors = {}
+    for i in range(n):
+        for j in range(n):
+            neighbors['{}.{}'.format(i, j)] = [
+                '{}.{}'.format(i + di, j + dj) for di in (-1, 0, 1) for dj in (-1, 0, 1)
+                if (di or dj) and 0 <= i + di < n and 0 <= j + dj < n]
+    return MapColoring(list(colors), neighbors)
+
+
+def timetable(seed, lectures):
+    csp = SyntheticUniversity(lectures, seed=seed).csp()
+    csp.setup_constraints()
+    return csp
+
+
+def backtracking(make, *inference):
+    def setup(seed, *args):
+        csp = make(*args)
+        return lambda stats: BacktrackingSearch(
+            csp, minimum_remaining_value, *inference, stats=stats)
+    return setup
+
+
+def arc_consistency(make):
+    def setup(seed, *args):
+        csp = make(*args)
+        return lambda stats: AC3(csp, stats=stats)
+    return setup
+
+
+def local_search(make, search, **options):
+    def setup(seed, *args):
+        csp = make(seed, *args)
+        def run(stats):
+            result = search(csp, stats=stats, rng=random.Random(seed), **options)
+            return result is not None and len(result) == len(csp.variables)
+        return run
+    return setup
+
+
+def feasible_timetable(seed, lectures):
+    planner = SyntheticUniversity(lectures, seed=seed).planner(seed=seed)
+    def run(stats):
+        planner.create_feasible_timetable()
+        return not any(sum(group.unplanned_lectures.values()) for group in planner.groups)
+    return run
+
+
+for level, puzzle in SUDOKU.items():
+    case('sudoku/{}/mrv+fc'.format(level), backtracking(Sudoku), puzzle)
+    case('sudoku/{}/mrv+mac'.format(level),
+         backtracking(Sudoku, least_constraining_value, maintain_arc_consistency), puzzle)
+    case('sudoku/{}/ac3'.format(level), arc_consistency(Sudoku), puzzle)
+
+case('map/australia/min_conflicts', local_search(lambda seed: australia(), min_conflicts))
+for n in (10, 30, 100):
+    case('map/king{}/mrv+fc'.format(n), backtracking(king_graph), n)
+    case('map/king{}/min_conflicts/5-colors'.format(n),
+         local_search(lambda seed, n: king_graph(n, 'RGBYW'), min_conflicts, max_steps=20000), n)
+
+for lectures in (100, 300, 1000):
+    case('timetable{}/ac3'.format(lectures),
+         arc_consistency(lambda n: timetable(0, n)), lectures)
+    case('timetable{}/min_conflicts'.format(lectures),
+         local_search(timetable, min_conflicts, max_steps=20000), lectures)
+for lectures in (100, 300):
+    case('timetable{}/iterative_forward_search'.format(lectures),
+         local_search(timetable, iterative_forward_search, max_steps=2000), lectures)
+
+for lectures in (1000, 10000, 50000):
+    case('planner{}/create_feasible_timetable'.format(lectures), feasible_timetable, lectures)
+
+
+def measure(setup, repeats, memory=True):
+    times, checks, work, successes, peak = [], [], [], 0, None
+    for seed in range(repeats):
+        run, stats = setup(seed), SearchStats()
+        gc.collect()
+        start = time.perf_counter()
+        successes += bool(run(stats))
+        times.append(time.perf_counter() - start)
+        checks.append(stats.checks)
+        work.append(stats.nodes + stats.steps + stats.revisions)
+    if memory:
+        run = setup(0)
+        gc.collect()
+        tracemalloc.start()
+        run(SearchStats())
+        peak = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return {'time': statistics.median(times), 'peak_kb': peak,
+            'checks': statistics.mean(checks), 'work': statistics.mean(work),
+            'success': successes / repeats}
+
+
+def compare(results, baseline, tolerance):
+    ''' Lines describing regressions against baseline '''
+    regressions = []
+    for name, current in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if current['success'] < old['success']:
+            regressions.append('{}: success {:.0%} -> {:.0%}'.format(name, old['success'], current['success']))
+        if old['time'] > 0.01 and current['time'] > old['time'] * tolerance:
+            regressions.append('{}: time {:.3f}s -> {:.3f}s'.format(name, old['time'], current['time']))
+        if current['peak_kb'] and old['peak_kb'] and current['peak_kb'] > old['peak_kb'] * tolerance:
+            regressions.append('{}: peak {} KB -> {} KB'.format(name, old['peak_kb'], current['peak_kb']))
+        if current['checks'] > old['checks'] * tolerance:
+            regressions.append('{}: checks {:.0f} -> {:.0f}'.format(name, old['checks'], current['checks']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', default='', help='run cases containing this text')
+    parser.add_argument('-r', '--repeats', type=int, default=3)
+    parser.add_argument('--no-memory', dest='memory', action='store_false')
+    parser.add_argument('--save', action='store_true', help='store results as baseline')
+    parser.add_argument('--compare', action='store_true', help='compare with baseline')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print('{:<45} {:>9} {:>9} {:>11} {:>9} {:>8}'.format(
+        'case', 'time, s', 'peak, KB', 'checks', 'work', 'success'))
+    for name, setup in CASES:
+        if args.pattern not in name:
+            continue
+        result = results[name] = measure(setup, args.repeats, args.memory)
+        line = '{:<45} {:>9.3f} {:>9} {:>11.0f} {:>9.0f} {:>8.0%}'.format(
+            name, result['time'], result['peak_kb'] if result['peak_kb'] is not None else '-',
+            result['checks'], result['work'], result['success'])
+        if args.compare and name in baseline:
+            line += '  x{:.2f}'.format(result['time'] / max(baseline[name]['time'], 1e-9))
+        print(line, flush=True)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+    if args.compare:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print('REGRESSION', line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+""" Compact array-based form of CSP for worker processes and caches """
+
+from array import array
+
+from csp import CSP, Variable, Domain, DIFFERENT_VALUE, DIFFERENT_TIME
+
+
+KINDS = [DIFFERENT_VALUE, DIFFERENT_TIME] # tag of edge -> kind of constraint
+TAGS = {kind: tag for tag, kind in enumerate(KINDS)}
+TABLE = len(KINDS) # tag of edge whose constraint is kept as table of allowed pairs
+
+
+class CompactCSP:
+    ''' Flat copy of CSP state:
+
+        1) names of variables (str(var)) and table of all distinct values,
+           every value is referred by its integer code
+
+        2) distinct initial domains (shapes) as CSR arrays of value codes,
+           shape of every variable and bitmap of its current domain
+
+        3) neighbors as CSR arrays of variable indices with kind tag of
+           every edge (see CSP.constraint_kind); constraints without kind
+           are kept as dense tables of allowed pairs of initial domain
+           values (bytes, one per pair), equal tables are stored once
+
+        4) codes of assigned values (-1 for unassigned variables)
+
+        Such object pickles as a handful of arrays instead of a graph of
+        Variable objects. It can be turned back into CSP with to_csp().
+    '''
+    def __init__(self, csp):
+        self.names, self.values = [], []
+        self.shape_ptr, self.shape_codes = array('l', [0]), array('l')
+        self.shapes, self.present = array('l'), bytearray()
+        self.indptr, self.indices, self.kinds = array('l', [0]), array('l'), array('b')
+        self.assigned = array('l')
+        self.tables, self.edge_tables = [], array('l') # edge -> table index, -1 for kinds
+
+        codes, shapes = {}, {} # value -> code, id(init_domain) -> shape
+        tables = {} # table -> its index
+        position = {id(X): i for i, X in enumerate(csp.variables)}
+        for X in csp.variables:
+            shape = shapes.get(id(X.init_domain))
+            if shape is None:
+                shape = shapes[id(X.init_domain)] = len(self.shape_ptr) - 1
+                for value in X.init_domain:
+                    if value not in codes:
+                        codes[value] = len(self.values)
+                        self.values.append(value)
+                    self.shape_codes.append(codes[value])
+                self.shape_ptr.append(len(self.shape_codes))
+            self.names.append(str(X))
+            self.shapes.append(shape)
+            self.present.extend(X.curr_domain.present)
+            self.assigned.append(-1 if X.isunassigned() else codes[X.curr_value])
+            for Y in X.neighbors:
+                kind = csp.constraint_kind(X, Y)
+                self.indices.append(position[id(Y)])
+                if kind in TAGS:
+                    self.kinds.append(TAGS[kind])
+                    self.edge_tables.append(-1)
+                    continue
+                table = bytes(bool(csp.constraints(X, a, Y, b))
+                              for a in X.init_domain for b in Y.init_domain)
+                if table not in tables:
+                    tables[table] = len(self.tables)
+                    self.tables.append(table)
+                self.kinds.append(TABLE)
+                self.edge_tables.append(tables[table])
+            self.indptr.append(len(self.indices))
+
+    def __len__(self):
+        return len(self.names)
+
+    def domain(self, i):
+        ''' Codes of values in initial domain of i-th variable '''
+        shape = self.shapes[i]
+        return self.shape_codes[self.shape_ptr[shape]:self.shape_ptr[shape + 1]]
+
+    def neighbors(self, i):
+        ''' Triples (neighbor index, kind tag, table index) of i-th variable '''
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return zip(self.indices[start:end], self.kinds[start:end], self.edge_tables[start:end])
+
+    def assignment(self):
+        ''' Current assignment as {name: value} dictionary '''
+        return {name: self.values[c] for name, c in zip(self.names, self.assigned) if c >= 0}
+
+    def to_csp(self):
+        return KindCSP(self)
+
+
+class KindCSP(CSP):
+    ''' CSP rebuilt from CompactCSP. Constraints between variables are given
+        by kind tags of edges or by tables of allowed pairs, that is enough
+        for any local search or backtracking routine but not for
+        subclass-specific preferences.
+    '''
+    def __init__(self, model):
+        super().__init__()
+        self.kinds = {}
+        self.tables = {} # (id(A), id(B)) -> allowed pairs of edge without kind
+        shapes = {}
+        offset = 0
+        for i, name in enumerate(model.names):
+            shape = model.shapes[i]
+            if shape not in shapes:
+                values = tuple(model.values[c] for c in model.domain(i))
+                shapes[shape] = values, {v: k for k, v in enumerate(values)}
+            domain = Domain(*shapes[shape])
+            domain.present[:] = model.present[offset:offset + len(domain.values)]
+            domain.size = domain.present.count(1)
+            offset += len(domain.values)
+            self.add_variable(Variable(domain, name=name))
+        for i, X in enumerate(self.variables):
+            for j, tag, table in model.neighbors(i):
+                Y = self.variables[j]
+                X.neighbors.append(Y)
+                if tag == TABLE:
+                    self.tables[id(X), id(Y)] = model.tables[table]
+                else:
+                    self.kinds[id(X), id(Y)] = KINDS[tag]
+        for X, c in zip(self.variables, model.assigned):
+            if c >= 0:
+                X.assign(model.values[c])
+
+    def __reduce__(self):
+        return KindCSP, (CompactCSP(self),)
+
+    def constraint_kind(self, A, B):
+        return self.kinds.get((id(A), id(B)))
+
+    def constraints(self, A, a, B, b):
+        kind = self.constraint_kind(A, B)
+        if kind == DIFFERENT_TIME:
+            return a[0] != b[0]
+        if kind == DIFFERENT_VALUE:
+            return a != b
+        table = self.tables.get((id(A), id(B)))
+        if table is not None:
+            index = A.curr_domain.index[a] * len(B.init_domain) + B.curr_domain.index[b]
+            return table[index] == 1
+        return True
+
+    def has_support(self, A, a, B):
+        if self.constraint_kind(A, B) == DIFFERENT_VALUE:
+            return len(B.curr_domain) > 1 or a not in B.curr_domain
+        return None
@@ -1,14 +1,18 @@
 import itertools, re, random
 from functools import reduce
-from collections import namedtuple
+from collections import namedtuple, defaultdict
+from contextlib import contextmanager
 
-from dbconnect import *
 from utils import *
+from algorithms import *
 
 
-database = UniversityDatabase()
 TimeSlot = namedtuple('TimeSlot', ['day', 'hour']) # timeslot in schedule
 
+# kinds of binary constraints (see CSP.constraint_kind)
+DIFFERENT_VALUE = 'value' # variables can't take equal values, e.g. (timeslot, room) pair
+DIFFERENT_TIME = 'time'   # variables can't share timeslot, i.e. first item of value
+
 
 def get_group_disciplines():
     return {
@@ -88,13 +92,60 @@ def tolist(var_dict):
     return list(var_dict.values())
 
 
+class Domain:
+    ''' Current domain of variable. Values are interned to indices of initial
+        domain and presence of each value is kept in bytearray, so removal,
+        restoring, membership and size queries are O(1). Iteration keeps
+        the order of initial domain. Variables with equal initial domains
+        can share values and index (see ScheduleVariable).
+    '''
+    __slots__ = ('values', 'index', 'present', 'size')
+
+    def __init__(self, values, index = None):
+        self.values = tuple(values)
+        self.index = index if index is not None else \
+            {v: i for i, v in enumerate(self.values)}
+        self.present = bytearray(b'\x01') * len(self.values)
+        self.size = len(self.values)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return map(self.values.__getitem__,
+                   itertools.compress(range(len(self.values)), self.present))
+
+    def __contains__(self, value):
+        i = self.index.get(value)
+        return i is not None and self.present[i] == 1
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def remove(self, value):
+        i = self.index.get(value)
+        if i is None or not self.present[i]:
+            raise ValueError('{} is not in domain'.format(value))
+        self.present[i] = 0
+        self.size -= 1
+
+    def restore(self, value):
+        i = self.index[value]
+        if not self.present[i]:
+            self.present[i] = 1
+            self.size += 1
+
+
 class Variable:
     def __init__(self, domain:list, neighbors = None, name = None):
+        if not isinstance(domain, Domain):
+            domain = Domain(domain)
         self.__name = name
-        self.__init_domain = domain
+        self.__init_domain = domain.values
         self.neighbors = [] if neighbors is None else neighbors
         self.curr_domain = domain
         self.curr_value = None
+        self.watchers = [] # structures notified on every value change (see Watcher)
 
     @property
     def init_domain(self):
@@ -106,10 +157,14 @@ class Variable:
 
     def assign(self, value):
         assert(value in self.curr_domain)
-        self.curr_value = value
+        previous, self.curr_value = self.curr_value, value
+        for watcher in self.watchers:
+            watcher.value_changed(self, previous)
 
     def unassign(self):
-        self.curr_value = None
+        previous, self.curr_value = self.curr_value, None
+        for watcher in self.watchers:
+            watcher.value_changed(self, previous)
 
     def isassigned(self):
         return self.curr_value is not None
@@ -117,6 +172,9 @@ class Variable:
     def isunassigned(self):
         return self.curr_value is None
 
+    def __getstate__(self):
+        return dict(self.__dict__, watchers=[])
+
     def __eq__(self, other):
         return self.curr_value == other.curr_value
 
@@ -156,6 +214,10 @@ class RoomVariable(Variable):
 class CSP:
     def __init__(self):
         self.__variables = []
+        self.__watchers = {}
+        self.__trail = [] # pruned (variable, value) pairs, stored flat
+        self.__levels = [] # trail lengths at checkpoints
+        self.supports = {} # (id(X), x, id(Y)) -> last found support of x in Y, see AC3
         self.nassigned = 0
 
     @property
@@ -166,6 +228,11 @@ class CSP:
     def variables(self, val):
         self.__variables = val
 
+    def __getstate__(self):
+        ''' Structures keyed by id() of variables are meaningless in other
+            process, so they are dropped here and rebuilt on demand. '''
+        return dict(self.__dict__, _CSP__watchers={}, supports={})
+
     @property
     def assignment(self):
         return [v for v in self.variables if v.isassigned()]
@@ -176,18 +243,97 @@ class CSP:
     def setup_constraints(self):
         pass
 
+    def attach(self, watcher_type):
+        ''' Returns watcher of given type bound to this CSP. Watcher is created
+            on first request and then is kept up to date by variables itself.
+        '''
+        watcher = self.__watchers.get(watcher_type)
+        if watcher is None:
+            watcher = self.__watchers[watcher_type] = watcher_type(self)
+            for var in self.variables:
+                var.watchers.append(watcher)
+        return watcher
+
+    def detach(self, watcher_type):
+        watcher = self.__watchers.pop(watcher_type, None)
+        if watcher is not None:
+            for var in self.variables:
+                var.watchers.remove(watcher)
+
+    @contextmanager
+    def temporary_watchers(self):
+        ''' Watchers attached inside the block are detached on exit, so
+            solvers don't leave their bookkeeping on later assignments.
+            Watchers attached before the block are kept. '''
+        kept = set(self.__watchers)
+        try:
+            yield
+        finally:
+            for watcher_type in [t for t in self.__watchers if t not in kept]:
+                self.detach(watcher_type)
+
     def infer_assignment(self):
-        return dict((str(Xi), Xi.curr_domain) for Xi in self.variables)
+        return dict((str(Xi), list(Xi.curr_domain)) for Xi in self.variables)
+
+    def load_assignment(self, assignment):
+        ''' Assigns values from {str(variable): value} dictionary, variables
+            absent in it become unassigned. '''
+        for var in self.variables:
+            value = assignment.get(str(var))
+            if value is None:
+                var.unassign()
+            else:
+                var.assign(value)
+
+    def isfeasible(self):
+        ''' All variables are assigned and no constraint is violated '''
+        return all(v.isassigned() for v in self.variables) and not self.violation_list()
 
     def constraints(self, var1, value1, var2, value2):
         return var1 == var2 or value1 != value2
 
+    def constraint_kind(self, X, Y):
+        ''' Kind of constraint between neighbors X and Y (DIFFERENT_VALUE,
+            DIFFERENT_TIME) or None if it can't be described by a kind. '''
+        return None
+
+    def has_support(self, X, x, Y):
+        ''' Checks if some value of Y.curr_domain is consistent with X=x. Returns
+            None when answer can't be given without scanning Y.curr_domain. '''
+        return None
+
     def preferences(self):
         return 0 # thumb
 
-    def restoreall(self, removed):
-        for var, value in removed:
-            var.curr_domain.append(value)
+    def change_cost(self, var, old, new):
+        ''' How much replacing old value of var by new disturbs the plan,
+            used by repair to keep values close to original ones. '''
+        return 0 if old == new else 1
+
+    def checkpoint(self):
+        ''' Starts new trail level. All prunes made after it will be undone
+            by the matching backtrack() call. '''
+        self.__levels.append(len(self.__trail))
+
+    def prune(self, var, value):
+        ''' Removes value from current domain of var. Prunes made outside of
+            any checkpoint are permanent. '''
+        var.curr_domain.remove(value)
+        if self.__levels:
+            self.__trail.append(var)
+            self.__trail.append(value)
+        for watcher in var.watchers:
+            watcher.domain_changed(var)
+
+    def backtrack(self):
+        ''' Restores domains pruned since the last checkpoint. As Domain keeps
+            values on their initial positions, ordering is preserved. '''
+        level, trail = self.__levels.pop(), self.__trail
+        while len(trail) > level:
+            value, var = trail.pop(), trail.pop()
+            var.curr_domain.restore(value)
+            for watcher in var.watchers:
+                watcher.domain_changed(var)
 
     def conflicts(self, X, possible_value):
         ''' Returns number of conflicts in CSP for variable X '''
@@ -195,7 +341,15 @@ class CSP:
                               and not self.constraints(X, possible_value, Y, Y.curr_value))
         return len(list(filter(conflict, X.neighbors)))
 
+    def conflict_counts(self, X):
+        ''' Number of conflicts for every value of X.curr_domain (in order of
+            iteration). Subclasses may return numpy array instead of list. '''
+        return [self.conflicts(X, x) for x in X.curr_domain]
+
     def violation_list(self):
+        table = self.__watchers.get(ConflictTable)
+        if table is not None:
+            return list(table.violated)
         return [var for var in self.variables
                 if var.isassigned() and self.conflicts(var, var.curr_value) > 0]
 
@@ -228,12 +382,20 @@ class Sudoku(CSP):
                 nbrs = {var_dict[v] for v in var_dict if int(v) in new_neighbors}
                 var_dict[str(v)].neighbors.update(nbrs)
         self.variables = tolist(var_dict)
+        for v in self.variables: # sets of variables can't be unpickled, see CSP.__getstate__
+            v.neighbors = sorted(v.neighbors, key=lambda x: int(x.name))
 
     def constraints(self, var1, value1, var2, value2):
         return value1 != value2
 
+    def constraint_kind(self, X, Y):
+        return DIFFERENT_VALUE
+
+    def has_support(self, X, x, Y):
+        return len(Y.curr_domain) > 1 or x not in Y.curr_domain
+
     def infer_assignment(self):
-        return dict((v.name, v.curr_domain) for v in self.variables if 1 == len(v.curr_domain))
+        return dict((v.name, list(v.curr_domain)) for v in self.variables if 1 == len(v.curr_domain))
 
     def display(self):
         assignment = self.infer_assignment()
@@ -264,6 +426,12 @@ class MapColoring(CSP):
     def constraints(self, var1, value1, var2, value2):
         return value1 != value2
 
+    def constraint_kind(self, X, Y):
+        return DIFFERENT_VALUE
+
+    def has_support(self, X, x, Y):
+        return len(Y.curr_domain) > 1 or x not in Y.curr_domain
+
     def preferences(self):
         var = [x for x in self.variables if x.name == 'T'][0]
         return {
@@ -330,10 +498,11 @@ WEEK = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat']
 
 class ScheduleVariable(Variable):
     timeslots = [TimeSlot(d, h) for d in WEEK for h in range(1, 7)]
+    timeslot_index = {t: i for i, t in enumerate(timeslots)}
+    interned = {} # frozenset of rooms -> (values, index) shared by domains
 
     def __init__(self, lecturer, discipline, listeners, possible_rooms, count = 0):
-        super().__init__(domain=[(t, r) for t in ScheduleVariable.timeslots
-                                        for r in possible_rooms])
+        super().__init__(domain=ScheduleVariable.make_domain(possible_rooms))
         self.lecturer = lecturer
         self.discipline = discipline
         self.listeners = listeners
@@ -341,11 +510,23 @@ class ScheduleVariable(Variable):
         self.type = None
         self.count = count
 
+    @staticmethod
+    def make_domain(possible_rooms):
+        key = frozenset(possible_rooms)
+        if key not in ScheduleVariable.interned:
+            values = tuple((t, r) for t in ScheduleVariable.timeslots
+                                  for r in sorted(possible_rooms))
+            ScheduleVariable.interned[key] = values, {v: i for i, v in enumerate(values)}
+        return Domain(*ScheduleVariable.interned[key])
+
     def __hash__(self):
         return (self.count + 1) * (hash(self.lecturer) + hash(self.discipline))
 
     def __str__(self):
-        return ' '.join([self.lecturer, self.discipline, str(self.count)])
+        discipline = self.discipline
+        if isinstance(discipline, tuple): # (name, exercise type)
+            discipline = ' '.join(discipline)
+        return ' '.join([self.lecturer, discipline, str(self.count)])
 
     def samelecturers(self, other):
         return self.lecturer == other.lecturer
@@ -386,227 +567,183 @@ class TimetablePlanner2(CSP):
 
     '''
 
-    def __init__(self):
+    def __init__(self, lecturer_hours=None, group_disciplines=None, room_domains=None):
+        ''' Input dictionaries are described above, fixtures get_lecturer_hours(),
+            get_group_disciplines() and get_room_domains() are used by default '''
         super().__init__()
-        lecturer_hours = get_lecturer_hours()
-        room_domains = get_room_domains()
-        get_group_disciplines()
+        self.kinds = {} # (id(A), id(B)) -> kind of constraint, see setup_constraints
+        if lecturer_hours is None:
+            lecturer_hours = get_lecturer_hours()
+        if group_disciplines is None:
+            group_disciplines = get_group_disciplines()
+        if room_domains is None:
+            room_domains = get_room_domains()
+        subject_listeners = defaultdict(set)
+        for g, subjects in group_disciplines.items():
+            for subj in subjects:
+                subject_listeners[subj].add(g)
         for lecturer in sorted(lecturer_hours):
             subj_dict = lecturer_hours[lecturer]
             for subj in subj_dict:
                 n = subj_dict[subj]
                 while n > 0:
                     possible_rooms = set(room_domains[subj])
-
-                    listeners = {g for g, s in get_group_disciplines().items()
-                                   if subj in s}
+                    listeners = set(subject_listeners[subj])
                     self.add_variable(ScheduleVariable(lecturer, subj, listeners, possible_rooms, n))
                     n -= 1
 
     def setup_constraints(self):
-        for Xi in self.variables:
-            for Xj in self.variables:
-                if Xi is Xj: continue
-                if Xi.samelecturers(Xj) or Xi.samerooms(Xj) or Xi.samelisteners(Xj):
-                    Xi.neighbors.append(Xj)
+        ''' Links variables having common lecturer, listeners or possible rooms.
+            Candidates are taken from inverted indexes (lecturer, group, room ->
+            variables), so work is proportional to the number of edges instead
+            of all variable pairs. Kind of every edge is kept in self.kinds.
+        '''
+        by_lecturer, by_group, by_room = defaultdict(list), defaultdict(list), defaultdict(list)
+        for X in self.variables:
+            by_lecturer[X.lecturer].append(X)
+            for g in X.listeners:
+                by_group[g].append(X)
+            for r in X.possible_rooms:
+                by_room[r].append(X)
+
+        order = {id(X): i for i, X in enumerate(self.variables)}
+        self.kinds = {}
+        for X in self.variables:
+            kinds = {id(X): None}
+            candidates = [by_lecturer[X.lecturer]] + [by_group[g] for g in X.listeners]
+            for Y in itertools.chain.from_iterable(candidates):
+                kinds.setdefault(id(Y), DIFFERENT_TIME)
+            for Y in itertools.chain.from_iterable(by_room[r] for r in X.possible_rooms):
+                kinds.setdefault(id(Y), DIFFERENT_VALUE)
+            del kinds[id(X)]
+            X.neighbors = [self.variables[i] for i in sorted(order[y] for y in kinds)]
+            for Y in X.neighbors:
+                self.kinds[id(X), id(Y)] = kinds[id(Y)]
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.kinds = {(id(X), id(Y)): TimetablePlanner2.relation(X, Y)
+                      for X in self.variables for Y in X.neighbors}
+
+    @staticmethod
+    def relation(A, B):
+        if A.samelecturers(B) or A.samelisteners(B):
+            return DIFFERENT_TIME
+        if A.samerooms(B):
+            return DIFFERENT_VALUE
+        return None
+
+    def constraint_kind(self, A, B):
+        kind = self.kinds.get((id(A), id(B)))
+        if kind is None and A is not B: # variables aren't linked by setup_constraints
+            kind = TimetablePlanner2.relation(A, B)
+        return kind
 
     def constraints(self, A, a, B, b):
-        if A is B: return True
-        aTime, aRoom = a
-        bTime, bRoom = b
-        if A.samelecturers(B) and aTime == bTime:
-            return False
-        if A.samerooms(B) and aTime == bTime and aRoom == bRoom:
-            return False
-        if A.samelisteners(B) and aTime == bTime:
-            return False # need more precise constraint (maybe subclass ScheduleVariable?)
+        kind = self.constraint_kind(A, B)
+        if kind == DIFFERENT_TIME:
+            return a[0] != b[0]
+        if kind == DIFFERENT_VALUE:
+            return a != b
         return True
 
+    def conflict_counts(self, X):
+        ''' Vectorised CSP.conflict_counts. Domain of X is timeslot-major grid
+            (timeslot x possible room), so conflicts with DIFFERENT_TIME
+            neighbors are counted per timeslot and repeated along the rooms,
+            and conflicts with DIFFERENT_VALUE ones are counted per cell. '''
+        if np is None:
+            return super().conflict_counts(X)
+        domain, times, cells = X.curr_domain, [], []
+        for Y in X.neighbors:
+            if Y.isassigned():
+                kind = self.constraint_kind(X, Y)
+                if kind == DIFFERENT_TIME:
+                    times.append(ScheduleVariable.timeslot_index[Y.curr_value[0]])
+                elif kind == DIFFERENT_VALUE and Y.curr_value in domain.index:
+                    cells.append(domain.index[Y.curr_value])
+        counts = np.repeat(np.bincount(times, minlength=len(ScheduleVariable.timeslots)),
+                           len(X.possible_rooms))
+        counts += np.bincount(cells, minlength=len(domain.values))
+        return counts[np.frombuffer(domain.present, dtype=np.bool_)]
+
+    def has_support(self, A, a, B):
+        ''' Constraints forbid sharing of timeslot or of (timeslot, room) pair,
+            so in most cases support is detected by the size of B's domain. '''
+        kind = self.constraint_kind(A, B)
+        if kind == DIFFERENT_TIME:
+            # B needs value with other timeslot, at most len(B.possible_rooms)
+            # values of B share timeslot with a
+            return True if len(B.curr_domain) > len(B.possible_rooms) else None
+        if kind == DIFFERENT_VALUE:
+            return len(B.curr_domain) > 1 or a not in B.curr_domain
+        return True
+
+    def change_cost(self, A, old, new):
+        ''' Changed room is less troublesome for groups than changed time,
+            and changed day is the worst '''
+        if old == new:
+            return 0
+        if old[0] == new[0]:
+            return 1
+        return 2 if old[0].day == new[0].day else 3
+
     def preferences(self):
         def max_day_load():
             pairs = [[v.curr_value[0].hour for v in self.variables
                      if v.curr_value[0].day == day] for day in WEEK]
             return max(map(max, filter(lambda x: len(x), pairs)))
 
-        return bounded_sum(self.weight_list().values())
+        # same as bounded_sum(self.weight_list().values()), kept up to date on assignments
+        return min(self.attach(WeightTable).total, INFINITY)
+
+    def weight(self, var):
+        if var.isunassigned():
+            return INFINITY
+        acc = 0
+        t, r = var.curr_value
+        if t.hour == 6:
+            acc += 10
+        if t.day == 'mon':
+            acc -= 2
+        if t.day == 'sat':
+            acc += 4
+        return acc
 
     def weight_list(self):
-        def weight(var):
-            if var.isunassigned():
-                return INFINITY
-            acc = 0
-            t, r = var.curr_value
-            if t.hour == 6:
-                acc += 10
-            if t.day == 'mon':
-                acc -= 2
-            if t.day == 'sat':
-                acc += 4
-            return acc
-
-        return {var : weight(var) for var in self.variables}
+        return {var : self.weight(var) for var in self.variables}
 
     def infer_assignment(self):
         return dict((str(Xi), Xi.curr_value) for Xi in self.variables
                     if Xi.isassigned())
 
 
-def AC3(csp, queue = None):
-    ''' Arc consistency. Реализует алгоритм поддержания ...'''
-    def revise(Xi, Xj):
-        revised = False
-        for x in Xi.curr_domain:
-            if every(lambda y: not csp.constraints(Xi, x, Xj, y),
-                  [y for y in Xj.curr_domain]):
-                Xi.curr_domain.remove(x)
-                revised = True
-        return revised
-
-    if queue is None:
-        queue = [(Xi, Xk) for Xi in csp.variables for Xk in Xi.neighbors]
-    while queue:
-        (Xi, Xj) = queue.pop()
-        if revise(Xi, Xj):
-            if len(Xi.curr_domain) == 0: return False
-            for Xk in Xi.neighbors:
-                queue.append((Xk, Xi))
-    return True
-
-# Variable ordering heuristics
-
-def first_unassigned_variable(csp):
-    assert([v for v in csp.variables if not v.isassigned()]) # FIXME: will be removed
-    for v in csp.variables:
-        if not v.isassigned(): return v
-
-def minimum_remaining_value(csp):
-    pass
-
-
-# Value ordering heuristics
-
-def least_constraining_value(var, csp):
-    return sorted(var.curr_domain,
-                  key=lambda Vi: csp.conflicts(var, Vi))
-
-
-def forward_checking(X, csp, removed):
-    ''' Simplest way of inference. Whenever X is assigned, function establishes
-        arc consistency for it: for each unassigned variable Y connected to X
-        by constraint, delete from Y.curr_domain values inconsistent with X.value.
-
-        [According to: AIMA, 3rd, p.217]
-    '''
-    for Y in X.neighbors:
-        if Y.isunassigned():
-            for y in Y.curr_domain:
-                if not csp.constraints(X, X.curr_value, Y, y):
-                    Y.curr_domain.remove(y)
-                    removed.append((Y, y))
-            if not Y.curr_domain:
-                return False
-    return True
-
-
-def BacktrackingSearch(csp,
-                       select_unassigned_variable=first_unassigned_variable,
-                       order_domain_values=least_constraining_value,
-                       inference=forward_checking):
-    ''' Backtracking algorithm for CSP. Variable selection, domain values
-        ordering and inference algorithms could be tuned.
-
-        [According to: AIMA, 3rd, p.214]
-    '''
-    def Backtrack():
-        if len(csp.assignment) == len(csp.variables):
-            return True
-        var = select_unassigned_variable(csp)
-        for value in order_domain_values(var, csp):
-            if not csp.conflicts(var, value):
-                var.assign(value)
-                removed = [(var, x) for x in var.curr_domain if x != value]
-                var.curr_domain = [value]
-                if inference(var, csp, removed):
-                    result = Backtrack()
-                    if result:
-                        return True
-                csp.restoreall(removed)
-            var.unassign()
-        return False
-
-    return Backtrack()
-
-
-def min_conflicts(csp, max_steps=10000):
-    def argmin_conflicts(var):
-        return argmin(lambda x: csp.conflicts(var, x),
-                      var.curr_domain, random.choice)
-
-    # initial assignment (probably unfeasible)
-    for var in csp.variables:
-        var.assign(argmin_conflicts(var))
-    # local search
-    best_value = INFINITY
-    best_assignment = None
-    for _ in range(max_steps):
-        violations = csp.violation_list()
-        if not violations: # all constrains satisfied
-            return {v.name:v.curr_value for v in csp.variables}
-        var = random.choice(violations)
-        val = argmin_conflicts(var)
-        var.assign(val)
-    return best_assignment
-
-
-def iterative_forward_search(csp, max_steps=5000):
-    def argmin_conflicts(var):
-        return argmin(lambda x: csp.conflicts(var, x),
-                      var.curr_domain, random.choice)
-
-    def most_weight_variable(vars):
-        from operator import itemgetter
-        return max(csp.weight_list().items(), key=itemgetter(1))[0]
-
-    best_value, best_assignment = INFINITY, csp.infer_assignment()
-    for _ in range(max_steps):
-        X = most_weight_variable(csp.variables)
-        a = argmin_conflicts(X)
-        X.assign(a)
-        violations = csp.violation_list()
-        if not violations:
-            estimate = csp.preferences()
-            if estimate < best_value:
-                print(estimate)
-                best_value, best_assignment = estimate, csp.infer_assignment()
-        for Y in violations: Y.unassign()
-    return best_assignment
-
-
-ttp = TimetablePlanner2()
-#ttp.setup_constraints()
-#d1 = ttp.infer_assignment()
-#iterative_forward_search(ttp)
-#d2 = ttp.infer_assignment()
-#print(ttp.preferences())
-
-#for k in d2: print(k, d2[k])
-
-easy1   = '..3.2.6..9..3.5..1..18.64....81.29..7.......8..67.82....26.95..8..2.3..9..5.1.3..'
-s = Sudoku(easy1)
-#BacktrackingSearch(s)
-#s.display()
-
-australia = MapColoring(list('RGB'), {
-    'SA':  ['WA', 'NT', 'Q', 'NSW', 'V'],
-    'WA':  ['SA', 'NT'],
-    'Q' :  ['SA', 'NT', 'NSW'],
-    'NT':  ['WA', 'Q'],
-    'NSW': ['Q', 'V'],
-    'V':   ['SA', 'NSW'],
-    'T':   []
-})
-a = min_conflicts(australia)
-print_dictionary(a if a else {})
-
-# Stone Physics I practice 6 (TimeSlot(day='mon', hour=1), 302)
-# Jones Calculus II 2 (TimeSlot(day='mon', hour=1), 405)
\ No newline at end of file
+if __name__ == '__main__':
+    ttp = TimetablePlanner2()
+    #ttp.setup_constraints()
+    #d1 = ttp.infer_assignment()
+    #iterative_forward_search(ttp)
+    #d2 = ttp.infer_assignment()
+    #print(ttp.preferences())
+
+    #for k in d2: print(k, d2[k])
+
+    easy1   = '..3.2.6..9..3.5..1..18.64....81.29..7.......8..67.82....26.95..8..2.3..9..5.1.3..'
+    s = Sudoku(easy1)
+    #BacktrackingSearch(s)
+    #s.display()
+
+    australia = MapColoring(list('RGB'), {
+        'SA':  ['WA', 'NT', 'Q', 'NSW', 'V'],
+        'WA':  ['SA', 'NT'],
+        'Q' :  ['SA', 'NT', 'NSW'],
+        'NT':  ['WA', 'Q'],
+        'NSW': ['Q', 'V'],
+        'V':   ['SA', 'NSW'],
+        'T':   []
+    })
+    a = min_conflicts(australia)
+    print_dictionary(a if a else {})
+
+    # Stone Physics I practice 6 (TimeSlot(day='mon', hour=1), 302)
+    # Jones Calculus II 2 (TimeSlot(day='mon', hour=1), 405)
@@ -1,101 +1,351 @@
-from PyQt4.QtSql import *
-from collections import namedtuple
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+from collections import namedtuple, defaultdict
 
 
 class ConnectionError(Exception): pass
 class DatabaseError(Exception): pass
+class PoolExhausted(ConnectionError): pass
 class IncorrectOrder(Exception): pass
 ConnData = namedtuple('ConnData', ['host', 'user', 'password', 'dbname'])
 Teacher = namedtuple('Teacher', ['id', 'firstname', 'middlename', 'lastname'])
 Group = namedtuple('Group', ['id', 'name', 'size'])
 Exercise = namedtuple('Exercise', ['id', 'type', 'name'])
 Room = namedtuple('Room', ['id', 'name', 'type', 'size'])
+Institute = namedtuple('Institute', ['groups', 'teachers'])
 
 
-def throw_sql_error(function):
-    def wrapper(self, *args):
-        if not function(self, *args):
-            msg = "{0} failed: {1}".format(
-                function.__name__, self.query.lastError().text())
-            raise DatabaseError(msg)
-    return wrapper
+def in_list(values) -> str:
+    ''' Placeholders of SQL list for values: "(?, ?, ?)" '''
+    return '({})'.format(', '.join('?' * len(values)))
 
 
-def createConnection(host:str, user:str, password:str, dbname=None) -> QSqlDatabase:
-    db = QSqlDatabase.addDatabase('QMYSQL')
-    db.setHostName(host)
-    db.setUserName(user)
-    db.setPassword(password)
-    if dbname is not None:
-        db.setDatabaseName(dbname)
-    if not db.open():
-        raise ConnectionError(db.lastError().text())
-    return db
+# tables used by UniversityDatabase and dummy.FictionUniversity, in SQLite dialect
+SCHEMA = [
+    "create table if not exists institutes (id integer primary key, name text, abr text, number integer)",
+    "create table if not exists departments (id integer primary key, institute_id integer, "
+    "name text, number integer)",
+    "create table if not exists positions (id integer primary key, name text)",
+    "create table if not exists process_types (`int` integer primary key, name text)",
+    "create table if not exists degrees (id integer primary key, name text, abr text)",
+    "create table if not exists buildings (id integer primary key, name text, abr text)",
+    "create table if not exists rooms (id integer primary key, building_id integer, name text, "
+    "process_type_id integer, comment text, size integer)",
+    "create table if not exists specialities (id integer primary key, institute_id integer, "
+    "name text, abr text, code integer, subname text)",
+    "create table if not exists groups (id integer primary key, speciality_id integer, "
+    "degree_id integer, year integer, kurs integer, number integer, name text, size integer)",
+    "create table if not exists teachers (id integer primary key, department_id integer, "
+    "position_id integer, firstname text, middlename text, lastname text)",
+    "create table if not exists disciplines (id integer primary key, speciality_id integer, "
+    "name text, plan integer, kurs integer, semestr integer, spec_code integer)",
+    "create table if not exists exercises (id integer primary key, teacher_id integer, "
+    "discipline_id integer, type_id integer, hours integer)"
+]
 
 
-class UniversityDatabase:
-    def __init__(self, data:ConnData = ConnData('localhost', 'work', '123', 'univercity')):
+class Backend:
+    ''' Source of DB-API connections. Queries are written with "?"
+        placeholders, sql() turns them into paramstyle of driver. '''
+    placeholder = '?'
+
+    def __init__(self, driver, data:ConnData):
+        self.driver = driver # DB-API module
+        self.data = data
+
+    def connect(self):
+        raise NotImplementedError
+
+    def cursor(self, connection):
+        ''' Cursor which doesn't load the whole result into memory '''
+        return connection.cursor()
+
+    def sql(self, query_text:str) -> str:
+        if self.placeholder == '?':
+            return query_text
+        return query_text.replace('%', '%%').replace('?', self.placeholder)
+
+
+class SQLiteBackend(Backend):
+    ''' Local database file (or "file:...?mode=memory&cache=shared" URI) '''
+    def __init__(self, path:str):
+        super().__init__(sqlite3, ConnData('sqlite', None, None, path))
+
+    def connect(self):
+        try:
+            return sqlite3.connect(self.data.dbname, uri=self.data.dbname.startswith('file:'),
+                                   check_same_thread=False)
+        except sqlite3.Error as e:
+            raise ConnectionError(str(e))
+
+    def create_schema(self):
+        connection = self.connect()
+        try:
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+        finally:
+            connection.close()
+
+
+class MySQLBackend(Backend):
+    ''' MySQL server via pymysql or MySQLdb, whichever is installed '''
+    placeholder = '%s'
+
+    def __init__(self, data:ConnData):
+        try:
+            import pymysql as driver
+            import pymysql.cursors
+        except ImportError:
+            import MySQLdb as driver
+            import MySQLdb.cursors
+        super().__init__(driver, data)
+
+    def cursor(self, connection):
+        return connection.cursor(self.driver.cursors.SSCursor) # server-side
+
+    def connect(self):
+        host, user, password, dbname = self.data
         try:
-            self.db = createConnection(*data)
-        except ConnectionError as e:
-            print(e)
-        self.query = QSqlQuery(self.db)
+            return self.driver.connect(host=host, user=user, password=password,
+                                       database=dbname, charset='utf8')
+        except self.driver.Error as e:
+            raise ConnectionError(str(e))
+
+
+class ConnectionPool:
+    ''' At most size connections of backend shared by threads. Connections
+        are opened on demand and reused; the one returned after an error is
+        rolled back first. Waiting for a free connection longer than
+        timeout seconds raises PoolExhausted instead of hanging, e.g. when
+        more than size unfinished streams are nested or left unclosed. '''
+    def __init__(self, backend:Backend, size:int = 4, timeout:float = 30.0):
+        self.backend = backend
+        self.size, self.timeout = size, timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolExhausted(
+                "No free connection in pool of {} for {} s: unfinished streams "
+                "hold them (nested deeper than pool size or not closed)".format(
+                    self.size, self.timeout))
+        try:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                connection = self.backend.connect()
+            try:
+                yield connection
+            except BaseException:
+                try:
+                    connection.rollback()
+                except self.backend.driver.Error:
+                    connection.close()
+                    raise
+                self.idle.put(connection)
+                raise
+            self.idle.put(connection)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class UniversityDatabase:
+    def __init__(self, backend = ConnData('localhost', 'work', '123', 'univercity'),
+                 pool_size:int = 4, batch_size:int = 1000, pool_timeout:float = 30.0):
+        ''' backend is Backend or ConnData of MySQL server. Methods named
+            stream_* and generators of this class read rows in batches of
+            batch_size through their own cursor; every unfinished iterator
+            holds a connection of the pool, PoolExhausted is raised after
+            pool_timeout seconds of waiting for one. '''
+        if isinstance(backend, ConnData):
+            backend = MySQLBackend(backend)
+        self.backend = backend
+        self.data = backend.data
+        self.pool = ConnectionPool(backend, pool_size, pool_timeout)
+        self.batch_size = batch_size
+
+
+    def close(self):
+        self.pool.close()
+
+
+    def stream(self, query_text:str, params = (), batch_size:int = None):
+        ''' Executes query with "?" placeholders and yields its rows as
+            tuples, fetching them by batch_size '''
+        batch_size = batch_size or self.batch_size
+        with self.pool.connection() as connection:
+            cursor = self.backend.cursor(connection)
+            try:
+                cursor.execute(self.backend.sql(query_text), tuple(params))
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    for row in batch:
+                        yield tuple(row)
+            except self.backend.driver.Error as e:
+                raise DatabaseError("{0} failed: {1}".format(query_text, e))
+            finally:
+                cursor.close()
+
+
+    def rows(self, query_text:str, params = ()) -> list:
+        ''' All rows of query as list of tuples '''
+        return list(self.stream(query_text, params))
+
+
+    def row_counts(self, tables) -> tuple:
+        ''' Number of rows and maximal id of every table, in one query.
+            Is used as version of data by snapshot cache. '''
+        columns = ', '.join("(select count(*) from {0}), (select max(id) from {0})".format(t)
+                            for t in tables)
+        return self.rows("select " + columns)[0]
 
 
     def get_disciplines_for_speciality(self, spec_id:int, semesters:tuple = ()):
-        query_text = "select id, name from disciplines " \
-                     "where speciality_id = {}".format(spec_id)
+        return list(self.stream_speciality_disciplines(spec_id, semesters))
+
+
+    def stream_speciality_disciplines(self, spec_id:int, semesters:tuple = ()):
+        ''' Pairs (discipline id, name) of speciality one by one '''
+        query_text = "select id, name from disciplines where speciality_id = ?"
         if semesters:
-            query_text += " and semestr in {}".format(semesters + (0,))
-        q = QSqlQuery(query_text)
-        disciplines = []
-        while q.next():
-            disciplines.append((q.value(0), q.value(1)))
-        return disciplines
+            query_text += " and semestr in {}".format(in_list(semesters + (0,)))
+        return self.stream(query_text, (spec_id,) + semesters + ((0,) if semesters else ()))
 
 
     def get_disciplines_for_group(self, group_id:str, semesters:tuple = ()):
-        self.query.exec("select speciality_id, name, size "
-                        "from groups where id = {}".format(group_id))
-        self.query.next()
-        spec_id, group_name, size = (self.query.value(x) for x in range(3))
+        spec_id, group_name, size = self.rows(
+            "select speciality_id, name, size from groups where id = ?", (group_id,))[0]
         return (Group(spec_id, group_name, size),
                 self.get_disciplines_for_speciality(spec_id, semesters))
 
 
     def get_disciplines_for_groups(self, ids:list, semesters:tuple = ()):
-        return dict([self.get_disciplines_for_group(id, semesters) for id in ids])
+        ''' The same as get_disciplines_for_group for every id, but in two queries '''
+        groups = self.load_groups(ids)
+        disciplines = self.load_disciplines({g.id for g in groups.values()}, semesters)
+        return {g: disciplines[g.id] for g in groups.values()}
+
+
+    def load_groups(self, ids:list) -> dict:
+        ''' group id -> Group(speciality_id, name, size) '''
+        if not ids:
+            return {}
+        ids = tuple(ids)
+        return {row[0]: Group(*row[1:]) for row in self.rows(
+            "select id, speciality_id, name, size "
+            "from groups where id in {}".format(in_list(ids)), ids)}
+
+
+    def load_disciplines(self, spec_ids, semesters:tuple = ()) -> defaultdict:
+        ''' speciality id -> [(discipline id, name)] '''
+        disciplines = defaultdict(list)
+        if not spec_ids:
+            return disciplines
+        params = tuple(spec_ids)
+        query_text = "select speciality_id, id, name from disciplines " \
+                     "where speciality_id in {}".format(in_list(params))
+        if semesters:
+            params += semesters + (0,)
+            query_text += " and semestr in {}".format(in_list(semesters + (0,)))
+        for spec_id, id, name in self.rows(query_text + " order by id", params):
+            disciplines[spec_id].append((id, name))
+        return disciplines
 
 
     def get_teacher_hours(self, teacher_id, semesters:tuple = ()):
-        q = QSqlQuery(self.db)
-        q.exec("select id, firstname, middlename, lastname "
-               "from teachers where id = {}".format(teacher_id))
-        name = q.next() and Teacher(*(q.value(x) for x in range(4)))
+        rows = self.rows("select id, firstname, middlename, lastname "
+                         "from teachers where id = ?", (teacher_id,))
+        name = rows and Teacher(*rows[0])
+        return name, dict(self.stream_teacher_hours(teacher_id, semesters))
+
+
+    def stream_teacher_hours(self, teacher_id, semesters:tuple = ()):
+        ''' Pairs (Exercise, hours) of teacher one by one '''
+        params = (teacher_id,)
         query_text = "select e.id, e.type_id, d.name, e.hours from " \
                      "(exercises e join disciplines d on e.discipline_id = d.id) " \
-                     "where teacher_id = {}".format(teacher_id)
+                     "where teacher_id = ?"
         if semesters:
-            query_text += " and d.semestr in {}".format(semesters  + (0,))
-        q.exec(query_text)
-        discipline_hours = []
-        while q.next():
-            discipline_hours.append((Exercise(q.value(0), q.value(1), q.value(2)), q.value(3)))
-        return (name, dict(discipline_hours))
+            params += semesters + (0,)
+            query_text += " and d.semestr in {}".format(in_list(semesters + (0,)))
+        for id, type_id, discipline, hours in self.stream(query_text, params):
+            yield Exercise(id, type_id, discipline), hours
 
 
     def get_teachers_hours_for_institute(self, inst_id:int, semesters:tuple = ()):
-        self.query.exec("select id from teachers where department_id in "
-                        "(select id from departments where institute_id = {})".format(inst_id))
-        while self.query.next():
-            yield self.get_teacher_hours(self.query.value(0), semesters)
+        ''' Pairs (Teacher, {Exercise: hours}) as get_teacher_hours returns,
+            for all teachers of institute, streamed by one query '''
+        return self.stream_teachers_hours(inst_id, semesters)
+
+
+    def stream_institute_groups(self, inst_id:int, semesters:tuple = ()):
+        ''' Pairs (Group, [(discipline id, name)]) for groups of institute
+            one by one, as get_disciplines_for_group returns them '''
+        params = (inst_id,)
+        condition = ""
+        if semesters:
+            params = semesters + (0,) + params
+            condition = " and d.semestr in {}".format(in_list(semesters + (0,)))
+        rows = self.stream(
+            "select g.id, g.speciality_id, g.name, g.size, d.id, d.name from "
+            "((groups g join specialities s on g.speciality_id = s.id) "
+            "left join disciplines d on d.speciality_id = g.speciality_id" + condition + ") "
+            "where s.institute_id = ? order by g.id, d.id", params)
+        for _, group_rows in groupby(rows, itemgetter(0)):
+            group_rows = list(group_rows)
+            yield (Group(*group_rows[0][1:4]),
+                   [(id, name) for *_, id, name in group_rows if id is not None])
+
+
+    def stream_teachers_hours(self, inst_id:int, semesters:tuple = ()):
+        ''' Pairs (Teacher, {Exercise: hours}) for teachers of institute one
+            by one, ordered by id '''
+        params = (inst_id,)
+        condition = ""
+        if semesters:
+            params = semesters + (0,) + params
+            condition = " and d.semestr in {}".format(in_list(semesters + (0,)))
+        rows = self.stream(
+            "select t.id, t.firstname, t.middlename, t.lastname, "
+            "e.id, e.type_id, d.name, e.hours from "
+            "((teachers t join departments dp on t.department_id = dp.id) "
+            "left join (exercises e join disciplines d on e.discipline_id = d.id) "
+            "on e.teacher_id = t.id" + condition + ") "
+            "where dp.institute_id = ? order by t.id, e.id", params)
+        for _, teacher_rows in groupby(rows, itemgetter(0)):
+            teacher_rows = list(teacher_rows)
+            yield (Teacher(*teacher_rows[0][:4]),
+                   {Exercise(id, type_id, name): hours
+                    for *_, id, type_id, name, hours in teacher_rows if id is not None})
+
+
+    def load_institute(self, inst_id:int, semesters:tuple = ()) -> Institute:
+        ''' Groups with their disciplines and teachers with their exercises
+            of the whole institute in two queries '''
+        return Institute(dict(self.stream_institute_groups(inst_id, semesters)),
+                         list(self.stream_teachers_hours(inst_id, semesters)))
 
 
     def get_rooms_in_building(self, building_id:int):
-        self.query.exec("select id, name, process_type_id, size from rooms "
-                        "where building_id = {}".format(building_id))
-        while self.query.next():
-            yield Room(*(self.query.value(x) for x in range(4)))
+        for row in self.stream("select id, name, process_type_id, size from rooms "
+                               "where building_id = ?", (building_id,)):
+            yield Room(*row)
 
     def get_all_institute_groups(self, as_names = True):
         pass
@@ -1,256 +1,248 @@
 """ Module for random data generation """
 
+import math
 import random
 import itertools
+from contextlib import contextmanager
 from operator import itemgetter
-import PyQt4
-from PyQt4.QtSql import *
-from PyQt4.QtCore import *
-from dbconnect import createConnection
+from dbconnect import Backend, SQLiteBackend, MySQLBackend, ConnData, DatabaseError
 
 #__all__ = ['fillDatabase']
 
+# children first, so rows are deleted without foreign key checks
+TABLES = ['exercises', 'disciplines', 'groups', 'teachers', 'specialities', 'rooms',
+          'buildings', 'degrees', 'process_types', 'positions', 'departments', 'institutes']
+
+
 class FictionUniversity:
-    def __init__(self, db: QSqlDatabase):
-        assert(isinstance(db, QSqlDatabase))
-        self.db = db
-        self.query = QSqlQuery(self.db)
+    ''' Fills database with random data. Every fill_* method runs in one
+        transaction and inserts rows by multi-row statements of batch_size rows
+        (fewer for SQLite, which binds at most SQLITE_MAX_VARIABLES values). '''
+    SQLITE_MAX_VARIABLES = 999 # limit of SQLite before 3.32
+    def __init__(self, backend: Backend, batch_size: int = 200):
+        assert(isinstance(backend, Backend))
+        self.backend = backend
+        self.connection = backend.connect()
+        self.batch_size = batch_size
         self.department_uniq_num = 1
 
+    def close(self):
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self):
+        try:
+            yield
+            self.connection.commit()
+        except self.backend.driver.Error as e:
+            self.connection.rollback()
+            raise DatabaseError(str(e))
+        except BaseException:
+            self.connection.rollback()
+            raise
+
+    def select(self, query_text, params=()):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(self.backend.sql(query_text), params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def execute(self, query_text, params=()):
+        ''' Runs statement without result, must be called inside transaction '''
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(self.backend.sql(query_text), params)
+        finally:
+            cursor.close()
+
+    def select_id(self, table, name):
+        ''' Id of the first row of table with name like given one '''
+        rows = self.select("select id from {} where name like ?".format(table), (name,))
+        if not rows:
+            raise DatabaseError('No row named {!r} in {}'.format(name, table))
+        return rows[0][0]
+
+    def rows_per_statement(self, columns):
+        if isinstance(self.backend, SQLiteBackend):
+            return min(self.batch_size, max(1, self.SQLITE_MAX_VARIABLES // len(columns)))
+        return self.batch_size
+
+    def insert(self, table, columns, rows):
+        ''' Inserts rows by statements "insert ... values (...), (...)" of
+            rows_per_statement rows each, must be called inside transaction '''
+        row = '({})'.format(', '.join('?' * len(columns)))
+        prefix = 'insert into {} ({}) values '.format(table, ', '.join(columns))
+        size = self.rows_per_statement(columns)
+        cursor = self.connection.cursor()
+        try:
+            rows = iter(rows)
+            while True:
+                batch = list(itertools.islice(rows, size))
+                if not batch:
+                    break
+                cursor.execute(self.backend.sql(prefix + ', '.join([row] * len(batch))),
+                               [value for values in batch for value in values])
+        finally:
+            cursor.close()
+
     def wipe(self):
-        query = self.query
-        query.exec("set @old_foreign_key_checks=@@foreign_key_checks, foreign_key_checks=0")
-        query.exec("select TABLE_NAME from information_schema.tables "
-                            "where TABLE_SCHEMA like '{}'".format(db.databaseName()))
-        while query.next():
-            del_query = QSqlQuery()
-            if not del_query.exec("delete from {}".format(query.value(0))):
-                raise DatabaseError("wipe() failed: " + del_query.lastError().text())
-
-    @throw_sql_error
+        with self.transaction():
+            for table in TABLES:
+                self.execute("delete from {}".format(table))
+
     def fill_institutes(self, data:list):
-        query = self.query
-        query.prepare("insert into institutes (name, abr, number) "
-                      "values (:name, :abr, :number)")
-        for name in data:
+        def institute(name):
             first_letters = list(map(itemgetter(0), name.split(' ')))
             first_letters.append('и')
             first_letters = ''.join(first_letters)
             first_letters = first_letters.upper()
-            query.bindValue(':name', name)
-            query.bindValue(':abr', first_letters)
-            query.bindValue(':number', random.randint(10000, 99999))
-            if not query.exec_():
-                return False
-        return True
-
-    @throw_sql_error
-    def fill_departments_for_institute(self, institute_id, departments:list):
-        query = self.query
-        query.prepare("insert into departments (institute_id, name, number) "
-                      "values ({}, :name, :number)".format(institute_id))
+            return name, first_letters, random.randint(10000, 99999)
+
+        with self.transaction():
+            self.insert('institutes', ('name', 'abr', 'number'), map(institute, data))
+
+    def department_rows(self, institute_id, departments:list):
         for name in departments:
-            query.bindValue(':name', name)
-            query.bindValue(':number', self.department_uniq_num)
+            yield institute_id, name, self.department_uniq_num
             self.department_uniq_num += 1
-            if not query.exec_():
-                return False
-        return True
+
+    def fill_departments_for_institute(self, institute_id, departments:list):
+        with self.transaction():
+            self.insert('departments', ('institute_id', 'name', 'number'),
+                        self.department_rows(institute_id, departments))
 
     def fill_departments(self, inst_dept:dict):
-        query = QSqlQuery(self.db)
-        query.exec("select id, name from institutes")
-        while query.next():
-            inst_id, inst_name = query.value(0), query.value(1)
-            departments = inst_dept[inst_name]
-            self.fill_departments_for_institute(inst_id, departments)
-
-    @throw_sql_error
+        with self.transaction():
+            for inst_id, inst_name in self.select("select id, name from institutes"):
+                self.insert('departments', ('institute_id', 'name', 'number'),
+                            self.department_rows(inst_id, inst_dept[inst_name]))
+
     def fill_positions(self, positions:list):
-        return all([self.query.exec("insert into positions (name) "
-                              "values ('{}')".format(p)) for p in positions])
+        with self.transaction():
+            self.insert('positions', ('name',), [(p,) for p in positions])
 
-    @throw_sql_error
     def fill_types(self, types:list):
-        return all([self.query.exec("insert into process_types (name) "
-                                    "values ('{}')".format(t)) for t in types])
+        with self.transaction():
+            self.insert('process_types', ('name',), [(t,) for t in types])
 
-    @throw_sql_error
     def fill_degrees(self, degrees:list):
-        return all([self.query.exec("insert into degrees (name, abr) "
-                                    "values ('{}', '')".format(d)) for d in degrees])
+        with self.transaction():
+            self.insert('degrees', ('name', 'abr'), [(d, '') for d in degrees])
 
-    @throw_sql_error
     def fill_buildings(self, buildings:list):
         def firts_letter(word):
             return word[0].upper()
 
         pairs = [(name, ''.join(list(map(firts_letter, name.split(' ')))))
                  for name in buildings]
-        return all([self.query.exec("insert into buildings (name, abr) "
-                                    "values ('{0}', '{1}')".format(*p)) for p in pairs])
+        with self.transaction():
+            self.insert('buildings', ('name', 'abr'), pairs)
 
-    @throw_sql_error
-    def fill_rooms_in_building(self, building_id, floors = (4, 10),
-                               rooms = (6, 20), size = (12, 100)):
-        query = self.query
-        query.exec("select `int`, name from process_types")
-        process_types = []
-        while query.next():
-            process_types.append(query.value(0))
+    def room_rows(self, building_id, floors = (4, 10), rooms = (6, 20), size = (12, 100)):
+        process_types = [t for t, in self.select("select `int` from process_types")]
         nfloors = random.randint(*floors)
         nrooms = random.randint(*rooms)
         minimum, maximum = size
         middle = (minimum + maximum) // 2
         room_names = [str(f*100+r) for f in range(1, nfloors+1) for r in range(1, nrooms+1)]
-        name_sizes = [(name, random.choice([minimum, middle, maximum]))
-                      for name in room_names]
-        query.prepare("insert into rooms "
-                      "(building_id, name, process_type_id, comment, size) values "
-                      "({}, :name, :type, :comment, :size)".format(building_id))
-        for name, size in name_sizes:
-            query.bindValue(':name', name)
-            query.bindValue(':type', random.choice(process_types))
-            query.bindValue(':comment', '')
-            query.bindValue(':size', size)
-            if not query.exec_():
-                return False
-        return True
+        for name in room_names:
+            yield (building_id, name, random.choice(process_types), '',
+                   random.choice([minimum, middle, maximum]))
+
+    def fill_rooms_in_building(self, building_id, floors = (4, 10),
+                               rooms = (6, 20), size = (12, 100)):
+        with self.transaction():
+            self.insert('rooms', ('building_id', 'name', 'process_type_id', 'comment', 'size'),
+                        self.room_rows(building_id, floors, rooms, size))
 
     def fill_rooms(self):
-        query = QSqlQuery(self.db)
-        query.exec("select id from buildings")
-        while query.next():
-            id = query.value(0)
-            print(id)
-            self.fill_rooms_in_building(id)
-
-    @throw_sql_error
-    def fill_institute_with_specialities(self, institute_id, spec:list):
-        query = self.query
-        query.prepare("insert into specialities (institute_id, name, abr, code, subname) "
-                      "values ({}, :name, '', :code, '')".format(institute_id))
+        with self.transaction():
+            for id, in self.select("select id from buildings"):
+                self.insert('rooms', ('building_id', 'name', 'process_type_id', 'comment', 'size'),
+                            self.room_rows(id))
+
+    def speciality_rows(self, institute_id, spec:list):
         for name in spec:
-            query.bindValue(':name', name)
-            query.bindValue(':code', random.randint(20000, 30000))
-            if not query.exec_():
-                return False
-        return True
+            yield institute_id, name, '', random.randint(20000, 30000), ''
+
+    def fill_institute_with_specialities(self, institute_id, spec:list):
+        with self.transaction():
+            self.insert('specialities', ('institute_id', 'name', 'abr', 'code', 'subname'),
+                        self.speciality_rows(institute_id, spec))
 
     def fill_specialities(self, inst_spec:dict):
-        query = QSqlQuery(self.db)
-        query.exec("select id, name from institutes")
-        while query.next():
-            inst_id, inst_name = query.value(0), query.value(1)
-            specialities = inst_spec[inst_name]
-            self.fill_institute_with_specialities(inst_id, specialities)
+        with self.transaction():
+            for inst_id, inst_name in self.select("select id, name from institutes"):
+                self.insert('specialities', ('institute_id', 'name', 'abr', 'code', 'subname'),
+                            self.speciality_rows(inst_id, inst_spec[inst_name]))
 
     def fill_groups(self):
-        query = self.query
-        query.exec("select id from degrees")
-        if query.next():
-            degree = query.value(0)
-        query.exec("select id from specialities")
-        while query.next():
-            spec_id = query.value(0)
-            insert_query = QSqlQuery(self.db)
-            insert_query.prepare("insert into groups (speciality_id, degree_id, year, kurs, number, name, size) "
-                                 "values (:id, :degree, :year, :kurs, :number, :name, :size)")
-            insert_query.bindValue(':id', spec_id)
-            insert_query.bindValue(':degree', degree)
+        degrees = self.select("select id from degrees")
+        degree = degrees[0][0] if degrees else None
+
+        def group(spec_id):
             n = random.choice([4,5])
-            insert_query.bindValue(':year', n)
-            insert_query.bindValue(':kurs', n)
-            insert_query.bindValue(':number', 0)
             name = 'гр. ' + str(random.randint(1000, 2000))
-            insert_query.bindValue(':name', name)
-            insert_query.bindValue(':size', 20)
-            if not insert_query.exec_():
-                return False
-        return True
+            return spec_id, degree, n, n, 0, name, 20
+
+        with self.transaction():
+            self.insert('groups', ('speciality_id', 'degree_id', 'year', 'kurs', 'number', 'name', 'size'),
+                        [group(spec_id) for spec_id, in self.select("select id from specialities")])
 
-    @throw_sql_error
     def fill_teachers_for_department(self, dept_name:str, fnames:list, mnames:list,
                                      lnames:list, overall:int = 8):
-        query = self.query
-        query.exec("select id from departments where name like '{}'".format(dept_name))
-        dept_id = query.next() and query.value(0)
-        query.exec("select id, name from positions")
-        positions = []
-        while query.next():
-            positions.append((query.value(0), query.value(1)))
-        query.prepare("insert into teachers (department_id, position_id, firstname, middlename, lastname) "
-                      "values (:did, :pid, :fname, :mname, :lname)")
+        dept_id = self.select_id('departments', dept_name)
+        positions = list(self.select("select id, name from positions"))
+        teachers = []
         while overall:
             pair = pid, pname = random.choice(positions)
             if pname == 'Зав. кафедрой':
                 positions.remove(pair)
-            query.bindValue(':did', dept_id)
-            query.bindValue(':pid', pid)
-            query.bindValue(':fname', random.choice(fnames))
-            query.bindValue(':mname', random.choice(mnames))
-            query.bindValue(':lname', random.choice(lnames))
-            if not query.exec_():
-                return False
+            teachers.append((dept_id, pid, random.choice(fnames),
+                             random.choice(mnames), random.choice(lnames)))
             overall -= 1
-        return True
+        with self.transaction():
+            self.insert('teachers', ('department_id', 'position_id', 'firstname',
+                                     'middlename', 'lastname'), teachers)
 
-    @throw_sql_error
     def fill_disciplines_for_speciality(self, spec_name:str, total_semesters = 9, per_semester = 8):
-        import math
-        query = self.query
-        query.exec("select id from specialities where name like '{}'".format(spec_name))
-        spec_id = query.next() and query.value(0)
-        query.prepare("insert into disciplines (speciality_id, name, plan, kurs, semestr, spec_code) "
-                          "values ({}, :name, :plan, :kurs, :semestr, :spec_code)".format(spec_id))
-        for s in range(1, total_semesters+1):
-            for n in range(1, per_semester+1):
-                name = 'Дисциплина-' + str(s) + str(n)
-                query.bindValue(':name', name)
-                query.bindValue(':plan', 20)
-                query.bindValue(':kurs', math.ceil(s/2))
-                query.bindValue(':semestr', s)
-                query.bindValue(':spec_code', 0)
-                if not query.exec_():
-                    return False
-        return True
-
-    @throw_sql_error
+        spec_id = self.select_id('specialities', spec_name)
+        disciplines = [(spec_id, 'Дисциплина-' + str(s) + str(n), 20, math.ceil(s/2), s, 0)
+                       for s in range(1, total_semesters+1) for n in range(1, per_semester+1)]
+        with self.transaction():
+            self.insert('disciplines', ('speciality_id', 'name', 'plan', 'kurs', 'semestr', 'spec_code'),
+                        disciplines)
+
     def fill_exercises_for_teachers(self, spec_name:str):
-        query = self.query
-        query.exec("select id from specialities where name like '{}'".format(spec_name))
-        spec_id = query.next() and query.value(0)
-        query.exec("select id from disciplines where speciality_id = {}".format(spec_id))
-        disciplines, types = [], []
-        while query.next():
-            disciplines.append(query.value(0))
-        query.exec("select `int` from process_types")
-        while query.next():
-            types.append(query.value(0))
-        query.exec("select id from teachers")
-        while query.next():
+        spec_id = self.select_id('specialities', spec_name)
+        disciplines = [d for d, in self.select(
+            "select id from disciplines where speciality_id = ?", (spec_id,))]
+        types = [t for t, in self.select("select `int` from process_types")]
+        exercises = []
+        for teacher_id, in self.select("select id from teachers"):
             if random.randint(1, 100) < 60:
                 continue
-            teacher_id = query.value(0)
-            q = QSqlQuery()
-            q.prepare("insert into exercises (teacher_id, discipline_id, type_id, hours) "
-                      "values (:tid, :did, :type, :hours)")
             for x in range(random.randint(1, 3)):
-                q.bindValue(':tid', teacher_id)
+                if not disciplines:
+                    break
                 d = random.choice(disciplines)
-                q.bindValue(':did', d)
                 if random.randint(1,100) < 80:
                     disciplines.remove(d)
-                q.bindValue(':type', random.choice(types))
-                q.bindValue(':hours', random.choice([2,2,3,4]))
-                if not q.exec_():
-                    return False
-        return True
+                exercises.append((teacher_id, d, random.choice(types), random.choice([2,2,3,4])))
+        with self.transaction():
+            self.insert('exercises', ('teacher_id', 'discipline_id', 'type_id', 'hours'), exercises)
 
 
 if __name__ == '__main__':
-    host, user, password = 'localhost', 'work', '123'
-    db = createConnection(host, user, password, 'univercity')
+    import sys
+    if len(sys.argv) > 1: # python dummy.py university.sqlite
+        backend = SQLiteBackend(sys.argv[1])
+        backend.create_schema()
+    else:
+        host, user, password = 'localhost', 'work', '123'
+        backend = MySQLBackend(ConnData(host, user, password, 'univercity'))
     insts = ['Математический', 'Политехнический',
              'Радиотехнический', 'Гуманитарный', 'Юридический']
     depts = [
@@ -276,7 +268,7 @@ if __name__ == '__main__':
     types = ['Лабораторная', 'Лекция', 'Практика']
     buildings = ['Главное здание', 'Северный корпус', 'Южный корпус', 'Новое здание']
     degrees = ['Специалитет', 'Магистратура', 'Бакалавриат']
-    fiction = FictionUniversity(db)
+    fiction = FictionUniversity(backend)
     # fiction.wipe()
     if True:
         try:
@@ -305,5 +297,4 @@ if __name__ == '__main__':
         except DatabaseError as e:
             print(e)
         finally:
-            fiction.query.exec("set foreign_key_checks=1")
-            db.close()
+            fiction.close()
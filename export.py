@@ -0,0 +1,156 @@
+""" Export of timetable to .ods, .csv and .json
+
+Timetable is exported as three views - groups, lecturers and rooms. Every
+view is a table with a row per group (lecturer, room) and a column per
+time slot, cell keeps "subject, lecturer (group), room". Rows are
+generated one by one and written to file at once, so neither the whole
+table nor the document tree is built in memory.
+
+    export_timetable(planner, 'timetable.ods')  # one sheet per view
+    export_timetable(planner, 'timetable.csv')  # timetable-groups.csv, ...
+    export_timetable(planner, 'timetable.json') # {"groups": [...], ...}
+"""
+
+import csv
+import io
+import json
+import os
+import zipfile
+from collections import namedtuple, defaultdict
+from xml.sax.saxutils import escape
+
+from planner import TIME_SLOTS, SLOT_INDEX
+
+__all__ = ['View', 'timetable_views', 'write_ods', 'write_csv', 'write_json', 'export_timetable']
+
+
+View = namedtuple('View', ['name', 'header', 'rows']) # rows is iterable of lists
+
+
+def cell(subject, who, room):
+    return '{}, {}, {}'.format(subject, who, room)
+
+
+def occupancy_rows(entities, name):
+    ''' Row [name, cell for every time slot] of every group or lecturer '''
+    for entity in entities:
+        row = [name(entity)] + [''] * len(TIME_SLOTS)
+        for slot, record in entity.busy_time.items():
+            row[1 + SLOT_INDEX[slot]] = cell(*record)
+        yield row
+
+
+def room_rows(groups):
+    ''' Rooms are not kept as entities of planner, so occupancy of rooms is
+        collected from groups first (it's as large as timetable itself) '''
+    rooms = defaultdict(dict) # room -> {slot index: cell}
+    for group in groups:
+        for slot, (subject, lecturer, room) in group.busy_time.items():
+            rooms[room][SLOT_INDEX[slot]] = cell(subject, group.id, room)
+    for room in sorted(rooms, key=str):
+        busy = rooms.pop(room)
+        yield [room] + [busy.get(i, '') for i in range(len(TIME_SLOTS))]
+
+
+def timetable_views(planner):
+    ''' Views of groups, lecturers and rooms of planner, rows are generated
+        lazily while view is written '''
+    slots = ['{} {}'.format(day, hour) for day, hour in TIME_SLOTS]
+    groups = sorted(planner.groups, key=lambda g: g.id)
+    lecturers = sorted(planner.lecturers, key=lambda l: l.name)
+    return [
+        View('groups', ['group'] + slots, occupancy_rows(groups, lambda g: g.id)),
+        View('lecturers', ['lecturer'] + slots, occupancy_rows(lecturers, lambda l: l.name)),
+        View('rooms', ['room'] + slots, room_rows(groups)),
+    ]
+
+
+## OpenDocument spreadsheet is written as plain XML into zip archive
+ODS_MIMETYPE = 'application/vnd.oasis.opendocument.spreadsheet'
+
+ODS_MANIFEST = '''<?xml version="1.0" encoding="UTF-8"?>
+<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">
+ <manifest:file-entry manifest:full-path="/" manifest:media-type="{}"/>
+ <manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>
+</manifest:manifest>
+'''.format(ODS_MIMETYPE)
+
+ODS_CONTENT_BEGIN = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<office:document-content'
+    ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+    ' xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"'
+    ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"'
+    ' office:version="1.2"><office:body><office:spreadsheet>')
+ODS_CONTENT_END = '</office:spreadsheet></office:body></office:document-content>'
+
+
+def ods_row(values):
+    cells, empty = [], 0
+    for value in values:
+        if value == '' or value is None:
+            empty += 1
+            continue
+        if empty:
+            cells.append('<table:table-cell table:number-columns-repeated="{}"/>'.format(empty))
+            empty = 0
+        cells.append('<table:table-cell office:value-type="string"><text:p>{}</text:p>'
+                     '</table:table-cell>'.format(escape(str(value))))
+    return '<table:table-row>{}</table:table-row>'.format(''.join(cells))
+
+
+def write_ods(views, filename):
+    ''' One sheet per view '''
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as archive:
+        # mimetype must be the first entry and must not be compressed
+        archive.writestr(zipfile.ZipInfo('mimetype'), ODS_MIMETYPE, zipfile.ZIP_STORED)
+        archive.writestr('META-INF/manifest.xml', ODS_MANIFEST)
+        with archive.open('content.xml', 'w') as raw:
+            content = io.TextIOWrapper(raw, encoding='utf-8')
+            content.write(ODS_CONTENT_BEGIN)
+            for view in views:
+                content.write('<table:table table:name="{}">'.format(escape(view.name, {'"': '&quot;'})))
+                content.write(ods_row(view.header))
+                for row in view.rows:
+                    content.write(ods_row(row))
+                content.write('</table:table>')
+            content.write(ODS_CONTENT_END)
+            content.flush()
+            content.detach()
+
+
+def csv_filename(filename, view):
+    base, ext = os.path.splitext(filename)
+    return '{}-{}{}'.format(base, view.name, ext or '.csv')
+
+
+def write_csv(views, filename):
+    ''' File per view: timetable.csv -> timetable-groups.csv, ... '''
+    for view in views:
+        with open(csv_filename(filename, view), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(view.header)
+            writer.writerows(view.rows)
+
+
+def write_json(views, filename):
+    ''' {view name: [{column: value}]}, empty cells are omitted '''
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for i, view in enumerate(views):
+            f.write('{}\n{}: ['.format(',' if i else '', json.dumps(view.name)))
+            for j, row in enumerate(view.rows):
+                record = {column: value for column, value in zip(view.header, row) if value != ''}
+                f.write('{}\n  {}'.format(',' if j else '', json.dumps(record, ensure_ascii=False)))
+            f.write('\n]')
+        f.write('\n}\n')
+
+
+FORMATS = {'.ods': write_ods, '.csv': write_csv, '.json': write_json}
+
+
+def export_timetable(planner, filename):
+    ''' Writes views of planner in format chosen by extension of filename '''
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError('Unknown timetable format: {}'.format(ext))
+    FORMATS[ext](timetable_views(planner), filename)
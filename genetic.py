@@ -0,0 +1,280 @@
+""" Genetic algorithm for planner.TimetablePlanner """
+
+import os
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from planner import TimetablePlanner, Group, Lecturer, RoomIndex
+
+
+WEEK, HOURS = TimetablePlanner.WEEK, TimetablePlanner.HOURS
+SLOTS = [(d, h) for d in WEEK for h in HOURS] # slot index -> (day, hour)
+SATURDAY = WEEK.index('SAT')
+
+
+class TimetableProblem:
+    ''' Static part of planning problem in integer form. Every lecture to
+        plan is a unit: units of i-th group occupy range
+        group_ptr[i]:group_ptr[i + 1] and are ordered by subject. Groups,
+        lecturers, subjects and rooms are referred by their indices.
+    '''
+    def __init__(self, planner):
+        self.constraints = planner.constraints
+        self.group_ids = [g.id for g in planner.groups]
+        self.lectures = [dict(g.unplanned_lectures) for g in planner.groups]
+        self.lecturer_names = [l.name for l in planner.lecturers]
+        self.lecturer_subjects = [list(l.subjects) for l in planner.lecturers]
+        self.subjects = sorted(planner.constraints)
+        self.rooms = sorted({r for c in planner.constraints.values() for r in c.rooms})
+
+        subject_index = {s: i for i, s in enumerate(self.subjects)}
+        room_index = {r: i for i, r in enumerate(self.rooms)}
+        self.subject_rooms = [tuple(room_index[r] for r in planner.constraints[s].rooms)
+                              for s in self.subjects]
+        self.subject_lecturers = [tuple(i for i, subjects in enumerate(self.lecturer_subjects)
+                                        if s in subjects) for s in self.subjects]
+        # free rooms of subjects (by indices) while individual is repaired
+        self.room_index = RoomIndex(dict(enumerate(self.subject_rooms)), len(SLOTS))
+        self.group_ptr, self.unit_group, self.unit_subject = array('l', [0]), array('i'), array('i')
+        for g, lectures in enumerate(self.lectures):
+            for subject in sorted(lectures):
+                for _ in range(lectures[subject]):
+                    self.unit_group.append(g)
+                    self.unit_subject.append(subject_index[subject])
+            self.group_ptr.append(len(self.unit_group))
+
+    def __len__(self):
+        return len(self.unit_group)
+
+    def planner(self, seed=None):
+        ''' New TimetablePlanner with nothing planned '''
+        return TimetablePlanner(
+            self.constraints,
+            [Group(g, dict(lectures)) for g, lectures in zip(self.group_ids, self.lectures)],
+            [Lecturer(l, list(s)) for l, s in zip(self.lecturer_names, self.lecturer_subjects)],
+            seed)
+
+    def encode(self, planner):
+        ''' Individual holding timetable of planner, lectures of the same
+            subject are matched to units in order of timeslots. '''
+        individual = Individual(len(self))
+        lecturer_index = {name: i for i, name in enumerate(self.lecturer_names)}
+        room_index = {r: i for i, r in enumerate(self.rooms)}
+        slot_index = {slot: i for i, slot in enumerate(SLOTS)}
+        groups = {g.id: g for g in planner.groups}
+        for g, group_id in enumerate(self.group_ids):
+            planned = sorted((self.subjects.index(subject), slot_index[slot], name, room)
+                             for slot, (subject, name, room) in groups[group_id].busy_time.items())
+            u, end = self.group_ptr[g], self.group_ptr[g + 1]
+            for subject, slot, name, room in planned:
+                while u < end and self.unit_subject[u] != subject:
+                    u += 1
+                individual.slots[u] = slot
+                individual.lecturers[u] = lecturer_index[name]
+                individual.rooms[u] = room_index[room]
+                u += 1
+        return individual
+
+    def decode(self, individual, planner):
+        ''' Replaces timetable of planner (with the same groups and
+            lecturers) by timetable of individual '''
+        groups = {g.id: g for g in planner.groups}
+        lecturers = {l.name: l for l in planner.lecturers}
+        for group in planner.groups:
+            for slot, (subject, name, room) in list(group.busy_time.items()):
+                planner.unplace(group, lecturers[name], slot, subject, room)
+                group.unplanned_lectures[subject] += 1
+        for u, slot in enumerate(individual.slots):
+            if slot < 0:
+                continue
+            group = groups[self.group_ids[self.unit_group[u]]]
+            subject = self.subjects[self.unit_subject[u]]
+            planner.place(group, lecturers[self.lecturer_names[individual.lecturers[u]]],
+                          SLOTS[slot], subject, self.rooms[individual.rooms[u]])
+            group.unplanned_lectures[subject] -= 1
+
+    def fitness(self, individual):
+        ''' The same value as TimetablePlanner.timetable_cost of decoded
+            timetable, computed on bit masks of busy hours per day '''
+        nhours = len(HOURS)
+        groups = [0] * (len(self.group_ids) * len(WEEK))
+        lecturers = [0] * (len(self.lecturer_names) * len(WEEK))
+        unplanned = 0
+        for u, slot in enumerate(individual.slots):
+            if slot < 0:
+                unplanned += 1
+                continue
+            day, hour = divmod(slot, nhours)
+            groups[self.unit_group[u] * len(WEEK) + day] |= 1 << hour
+            lecturers[individual.lecturers[u] * len(WEEK) + day] |= 1 << hour
+        cost = TimetablePlanner.UNPLANNED_PENALTY * unplanned
+        for masks, penalty in ((groups, TimetablePlanner.WINDOW_PENALTY),
+                               (lecturers, TimetablePlanner.LECTURER_WINDOW_PENALTY)):
+            for i, mask in enumerate(masks):
+                if not mask:
+                    continue
+                n = bin(mask).count('1')
+                span = mask.bit_length() - ((mask & -mask).bit_length() - 1)
+                cost += penalty * (span - n)
+                cost += TimetablePlanner.LATE_PENALTY * (mask >> (nhours - 1) & 1)
+                if i % len(WEEK) == SATURDAY:
+                    cost += TimetablePlanner.SATURDAY_PENALTY * n
+        return cost
+
+    def repair(self, individual, rng=random):
+        ''' Makes individual feasible: units are visited in random order,
+            those which break hard constraints are moved to another slot,
+            room or lecturer, or left unplanned if nothing fits. '''
+        nslots, nweek = len(SLOTS), len(WEEK)
+        slots, lecturers, rooms = individual.slots, individual.lecturers, individual.rooms
+        group_busy, lecturer_busy = set(), set()
+        day_count = [0] * (len(self.group_ids) * nweek)
+        room_index = self.room_index
+        room_index.reset([set() for _ in range(nslots)])
+
+        def fits(u, slot, lecturer):
+            g = self.unit_group[u]
+            return (g * nslots + slot not in group_busy and
+                    lecturer * nslots + slot not in lecturer_busy and
+                    day_count[g * nweek + slot // len(HOURS)] < TimetablePlanner.MAX_DAY_LECTURES)
+
+        def occupy(u, slot, lecturer, room):
+            g = self.unit_group[u]
+            group_busy.add(g * nslots + slot)
+            lecturer_busy.add(lecturer * nslots + slot)
+            room_index.take(room, slot)
+            day_count[g * nweek + slot // len(HOURS)] += 1
+            slots[u], lecturers[u], rooms[u] = slot, lecturer, room
+
+        order = list(range(len(self)))
+        rng.shuffle(order)
+        pending = []
+        for u in order:
+            slot = slots[u]
+            if slot >= 0 and fits(u, slot, lecturers[u]) and room_index.is_free(rooms[u], slot):
+                occupy(u, slot, lecturers[u], rooms[u])
+            else:
+                pending.append(u)
+        candidates = list(range(nslots))
+        for u in pending:
+            subject = self.unit_subject[u]
+            teachers = sorted(self.subject_lecturers[subject], key=lambda l: l != lecturers[u])
+            rng.shuffle(candidates)
+            slots[u] = -1
+            for slot in candidates:
+                lecturer = next((l for l in teachers if fits(u, slot, l)), None)
+                if lecturer is None:
+                    continue
+                room = room_index.random_free(subject, slot, rng)
+                if room is not None:
+                    occupy(u, slot, lecturer, room)
+                    break
+        return individual
+
+    def crossover(self, a, b, rng=random):
+        ''' Child takes lectures of every group from one of parents '''
+        child = a.copy()
+        for g in range(len(self.group_ids)):
+            if rng.random() < 0.5:
+                start, end = self.group_ptr[g], self.group_ptr[g + 1]
+                child.slots[start:end] = b.slots[start:end]
+                child.lecturers[start:end] = b.lecturers[start:end]
+                child.rooms[start:end] = b.rooms[start:end]
+        return child
+
+    def mutate(self, individual, rate, rng=random):
+        ''' Moves every unit to random slot with probability rate '''
+        for u in range(len(self)):
+            if rng.random() < rate:
+                individual.slots[u] = rng.randrange(len(SLOTS))
+        return individual
+
+
+class Individual:
+    ''' Timetable as three arrays indexed by units of TimetableProblem:
+        slot index (-1 if unplanned), lecturer index and room index.
+        Takes 9 bytes per lecture. '''
+    __slots__ = ('slots', 'lecturers', 'rooms', 'fitness')
+
+    def __init__(self, size=0):
+        self.slots = array('b', [-1]) * size
+        self.lecturers = array('i', [0]) * size
+        self.rooms = array('i', [0]) * size
+        self.fitness = None
+
+    def __getstate__(self):
+        return self.slots, self.lecturers, self.rooms, self.fitness
+
+    def __setstate__(self, state):
+        self.slots, self.lecturers, self.rooms, self.fitness = state
+
+    def copy(self):
+        other = Individual()
+        other.slots, other.lecturers, other.rooms = (
+            array('b', self.slots), array('i', self.lecturers), array('i', self.rooms))
+        return other
+
+
+_problem = None # TimetableProblem of worker process
+
+def _init_worker(problem):
+    global _problem
+    _problem = problem
+
+def _fitness(individual):
+    return _problem.fitness(individual)
+
+
+def genetic_search(planner, population_size=100, generations=50, crossover_rate=0.9,
+                   mutation_rate=0.02, elite=2, tournament=3, max_workers=None, seed=None):
+    ''' Minimizes TimetablePlanner.timetable_cost by genetic algorithm.
+        Initial population consists of timetables built by
+        create_feasible_timetable, crossover and mutation are followed by
+        repair, so every individual satisfies hard constraints. Fitness of
+        a generation is evaluated in process pool (in this process if
+        max_workers == 1). Planner must have nothing planned, best timetable
+        found is written into it. Returns its cost. Search is reproduced
+        exactly by seed whatever number of workers is.
+    '''
+    rng = random.Random(seed)
+    problem = TimetableProblem(planner)
+    population = []
+    for _ in range(population_size):
+        initial = problem.planner(seed=rng.getrandbits(64))
+        initial.create_feasible_timetable()
+        population.append(problem.encode(initial))
+
+    executor, workers = None, max_workers or os.cpu_count() or 1
+    if workers != 1:
+        executor = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(problem,))
+    try:
+        def evaluate(individuals):
+            if executor is None:
+                fitness = map(problem.fitness, individuals)
+            else:
+                chunksize = max(1, len(individuals) // (4 * workers))
+                fitness = executor.map(_fitness, individuals, chunksize=chunksize)
+            for individual, value in zip(individuals, fitness):
+                individual.fitness = value
+
+        def select():
+            return min(rng.sample(population, tournament), key=lambda i: i.fitness)
+
+        evaluate(population)
+        for _ in range(generations):
+            population.sort(key=lambda i: i.fitness)
+            offspring = []
+            while len(offspring) < population_size - elite:
+                a, b = select(), select()
+                child = problem.crossover(a, b, rng) if rng.random() < crossover_rate else a.copy()
+                offspring.append(problem.repair(problem.mutate(child, mutation_rate, rng), rng))
+            evaluate(offspring)
+            population = population[:elite] + offspring
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    best = min(population, key=lambda i: i.fitness)
+    problem.decode(best, planner)
+    return best.fitness
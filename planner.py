@@ -1,6 +1,10 @@
+import math
 import random
+import time
+from array import array
 from collections import namedtuple, defaultdict
-import ezodf
+
+from utils import IndexedSet
 
 
 class SubjectType:
@@ -14,75 +18,196 @@ Constraint = namedtuple(
     ['rooms', 'type']
 )
 
-class Lecturer:
+WEEK = [
+    'MON', 'TUE', 'WED',
+    'THU', 'FRI', 'SAT'
+]
+HOURS = [
+    '1st', '2nd', '3rd',
+    '4th', '5th'#, '6th'
+]
+TIME_SLOTS = [(d, h) for d in WEEK for h in HOURS]
+SLOT_INDEX = {slot: i for i, slot in enumerate(TIME_SLOTS)} # (day, hour) -> index
+DAY_INDEX = {d: i for i, d in enumerate(WEEK)}
+
+
+class Occupancy:
+    ''' Timeslots taken by lecturer or group. Besides busy_time dictionary
+        they are kept in flat arrays: occupied (slot index -> 0/1) and
+        day_lectures (day index -> number of lectures), so checks are O(1).
+    '''
+    __slots__ = ('busy_time', 'occupied', 'day_lectures')
+
+    def __init__(self):
+        self.reset({})
+
+    def reset(self, busy_time):
+        self.busy_time = {}
+        self.occupied = bytearray(len(TIME_SLOTS))
+        self.day_lectures = array('b', [0]) * len(WEEK)
+        for timeslot, record in busy_time.items():
+            self.occupy(timeslot, record)
+
+    def is_busy(self, timeslot):
+        return self.occupied[SLOT_INDEX[timeslot]] == 1
+
+    def lecture_quantity(self, day):
+        return self.day_lectures[DAY_INDEX[day]]
+
+    def is_empty_day(self, day):
+        return self.lecture_quantity(day) == 0
+
+    def day_hours(self, day):
+        ''' Indices of busy hours of the day '''
+        start = DAY_INDEX[day] * len(HOURS)
+        return [h for h in range(len(HOURS)) if self.occupied[start + h]]
+
+    def occupy(self, timeslot, record):
+        self.busy_time[timeslot] = record
+        self.occupied[SLOT_INDEX[timeslot]] = 1
+        self.day_lectures[DAY_INDEX[timeslot[0]]] += 1
+
+    def free_slot(self, timeslot):
+        del self.busy_time[timeslot]
+        self.occupied[SLOT_INDEX[timeslot]] = 0
+        self.day_lectures[DAY_INDEX[timeslot[0]]] -= 1
+
+
+def _room_key(room):
+    return room
+
+
+class RoomIndex:
+    ''' Free rooms of every timeslot. pools maps a key (e.g. subject) to list
+        of suitable rooms, equal lists share one pool. For every (pool, slot)
+        free rooms are kept in IndexedSet built on first request, so random
+        free room of pool is O(1), taking or releasing room is O(number of
+        pools it belongs to).
+    '''
+    def __init__(self, pools, nslots):
+        self.nslots = nslots
+        self.pool_of, self.pool_rooms = {}, []
+        self.room_pools = defaultdict(list) # room -> indices of pools with it
+        distinct = {}
+        for key, rooms in pools.items():
+            rooms = tuple(rooms)
+            if rooms not in distinct:
+                distinct[rooms] = len(self.pool_rooms)
+                self.pool_rooms.append(rooms)
+                for room in rooms:
+                    self.room_pools[room].append(distinct[rooms])
+            self.pool_of[key] = distinct[rooms]
+        self.reset([set() for _ in range(nslots)])
+
+    def reset(self, taken):
+        ''' Replaces taken rooms (list of sets indexed by slot) '''
+        self.taken = taken
+        self.free = [[None] * self.nslots for _ in self.pool_rooms]
+
+    def free_rooms(self, key, slot):
+        pool = self.pool_of[key]
+        free = self.free[pool][slot]
+        if free is None:
+            taken = self.taken[slot]
+            free = self.free[pool][slot] = IndexedSet(
+                (r for r in self.pool_rooms[pool] if r not in taken), key=_room_key)
+        return free
+
+    def random_free(self, key, slot, rng=random):
+        ''' Random free room of pool or None '''
+        free = self.free_rooms(key, slot)
+        return rng.choice(free) if len(free) else None
+
+    def is_free(self, room, slot):
+        return room not in self.taken[slot]
+
+    def take(self, room, slot):
+        self.taken[slot].add(room)
+        for pool in self.room_pools[room]:
+            free = self.free[pool][slot]
+            if free is not None:
+                free.discard(room)
+
+    def release(self, room, slot):
+        self.taken[slot].remove(room)
+        for pool in self.room_pools[room]:
+            free = self.free[pool][slot]
+            if free is not None:
+                free.add(room)
+
+
+class Lecturer(Occupancy):
+    __slots__ = ('name', 'subjects')
+
     def __init__(self, name, subjects: list):
+        super().__init__()
         self.name = name
         self.subjects = subjects
-        self.busy_time = {} # dictionary with filled timeslots: (day, hour) -> (subject, groupid, room)
+        # busy_time: (day, hour) -> (subject, groupid, room)
 
     def __str__(self):
         return self.name
 
-    def is_busy(self, timeslot):
-        return timeslot in self.busy_time.keys()
-
     def fill_slot(self, timeslot, subject, groupid, room):
-        self.busy_time[timeslot] = (subject, groupid, room)
+        self.occupy(timeslot, (subject, groupid, room))
+
 
+class Group(Occupancy):
+    __slots__ = ('id', 'unplanned_lectures')
 
-class Group:
     def __init__(self, group_id: str, lectures: dict):
+        super().__init__()
         self.id = group_id
         self.unplanned_lectures = lectures # contains lectures without timeslots
-        self.busy_time = {} # dictionary contains such records: (day, hour) -> (subject, lecturer, room)
+        # busy_time: (day, hour) -> (subject, lecturer, room)
 
     def __str__(self):
         return self.id
 
-    def lecture_quantity(self, day):
-        return len([h for ((d, h), s) in self.busy_time.items() if d == day])
-
-    def is_busy(self, time_slot):
-        return time_slot in self.busy_time.keys()
-
-    def is_empty_day(self, day):
-        return self.lecture_quantity(day) == 0
-
     def fill_slot(self, timeslot, subject, lecturername, room):
-        self.busy_time[timeslot] = (subject, lecturername, room)
+        self.occupy(timeslot, (subject, lecturername, room))
 
 
 class TimetablePlanner:
-    WEEK = [
-        'MON', 'TUE', 'WED',
-        'THU', 'FRI', 'SAT'
-    ]
-    HOURS = [
-        '1st', '2nd', '3rd',
-        '4th', '5th'#, '6th'
-    ]
-
-    def __init__(self, constraints, groups, lecturers):
+    WEEK = WEEK
+    HOURS = HOURS
+    MAX_DAY_LECTURES = 4 # for one group
+
+    # penalties of soft constraints minimized by find_optimal_timetable
+    WINDOW_PENALTY = 3           # free hour between lectures of group
+    LECTURER_WINDOW_PENALTY = 1  # free hour between lectures of lecturer
+    SATURDAY_PENALTY = 2         # every lecture on saturday
+    LATE_PENALTY = 1             # every lecture on the last hour
+    UNPLANNED_PENALTY = 100      # every lecture left without timeslot
+
+    def __init__(self, constraints, groups, lecturers, seed=None):
         self.constraints = constraints
+        self.seed = seed
+        self.random = random.Random(seed) # all random choices of planner
         self.groups = groups
         self.lecturers = lecturers
-        self.taken_rooms = defaultdict(list)
+        self.room_index = RoomIndex(
+            {subject: c.rooms for subject, c in constraints.items()}, len(TIME_SLOTS))
+
+    @property
+    def taken_rooms(self):
+        ''' Sets of taken rooms indexed by slot index '''
+        return self.room_index.taken
 
 
     def plan_group_lectures(self, group, lecturer):
         ''' Fills group and lecturer objects with feaseble values of timeslots.
             Is used for random generation of feasible solution in genetic algorithm.
         '''
-        # list of subjects this group is studying
-        group_subjects = group.unplanned_lectures.keys()
+        # list of subjects this group is studying and which are not planned yet
+        group_subjects = [s for s, n in group.unplanned_lectures.items() if n > 0]
         # list of subjects which this lecturer is teaching for this group
-        actual_lectures = set(group_subjects).intersection(lecturer.subjects)
+        actual_lectures = [s for s in group_subjects if s in lecturer.subjects]
 
         if not actual_lectures: # lecturer is not teaching this group
             return
-        week, hours = TimetablePlanner.WEEK, TimetablePlanner.HOURS
-        time_slots = [(d, h) for d in week for h in hours]
-        random.shuffle(time_slots)
+        time_slots = list(TIME_SLOTS)
+        self.random.shuffle(time_slots)
 
         for lecture in actual_lectures:
             free_room = None
@@ -91,56 +216,278 @@ class TimetablePlanner:
                     break # all lectures for current subject were planned
                 if group.is_busy(slot) or lecturer.is_busy(slot):
                     continue
-                if group.lecture_quantity(slot[0]) >= 4:
+                if group.lecture_quantity(slot[0]) >= TimetablePlanner.MAX_DAY_LECTURES:
                     continue # not more than 4 lectures per day
-                try:
-                    free_room = random.choice(
-                        [r for r in self.constraints[lecture].rooms
-                        if r not in self.taken_rooms[slot]]
-                    )
-                except IndexError:
+                free_room = self.room_index.random_free(lecture, SLOT_INDEX[slot], self.random)
+                if free_room is None:
                     continue # if free room is absent then choose another timeslot
-                self.taken_rooms[slot].append(free_room)
-                lecturer.fill_slot(slot, lecture, group.id, free_room)
-                group.fill_slot(slot, lecture, lecturer.name, free_room)
+                self.place(group, lecturer, slot, lecture, free_room)
                 group.unplanned_lectures[lecture] -= 1
 
+    def place(self, group, lecturer, slot, subject, room):
+        self.room_index.take(room, SLOT_INDEX[slot])
+        lecturer.fill_slot(slot, subject, group.id, room)
+        group.fill_slot(slot, subject, lecturer.name, room)
 
-    def create_feasible_timetable(self):
-        ''' Returns imetable that maintains all constraints but is not optimal '''
-        random.shuffle(self.groups)
-        random.shuffle(self.lecturers)
-        for g in self.groups:
-            for l in self.lecturers:
-                self.plan_group_lectures(g, l)
+    def unplace(self, group, lecturer, slot, subject, room):
+        self.room_index.release(room, SLOT_INDEX[slot])
+        lecturer.free_slot(slot)
+        group.free_slot(slot)
 
 
-    def find_optimal_timetable(self):
-        pass
+    def create_feasible_timetable(self):
+        ''' Returns imetable that maintains all constraints but is not optimal '''
+        # groups and lecturers are visited in random order, lists themselves are kept
+        groups = self.random.sample(self.groups, len(self.groups))
+        lecturers = self.random.sample(self.lecturers, len(self.lecturers))
+        # only lecturers of group subjects having free slots are tried, in the same order
+        teaching = defaultdict(set)
+        for i, l in enumerate(lecturers):
+            for subject in l.subjects:
+                teaching[subject].add(i)
+        for g in groups:
+            candidates = set().union(*(teaching[s] for s in g.unplanned_lectures))
+            for i in sorted(candidates):
+                lecturer = lecturers[i]
+                self.plan_group_lectures(g, lecturer)
+                if 0 not in lecturer.occupied: # whole week is taken
+                    for subject in lecturer.subjects:
+                        teaching[subject].discard(i)
+
+
+    def repair_timetable(self, closed_rooms=(), absent_lecturers=(), max_steps=1000):
+        ''' Warm start after disruption of existing timetable. Lectures in
+            closed rooms and lectures of absent lecturers are unplanned, the
+            rooms stay taken for the whole week and absent lecturers are
+            removed from planner. Only groups which lost lectures are planned
+            again: first into free slots (by any lecturer of subject), then by
+            moves of their own lectures freeing a slot for unplanned one.
+            Timetables of other groups are not touched. Returns number of
+            lectures left unplanned.
+        '''
+        absent = set(absent_lecturers)
+        group_by_id = {g.id: g for g in self.groups}
+        affected = {}
+        for lecturer in self.lecturers:
+            for slot, (subject, group_id, room) in list(lecturer.busy_time.items()):
+                if lecturer.name in absent or room in closed_rooms:
+                    group = group_by_id[group_id]
+                    self.unplace(group, lecturer, slot, subject, room)
+                    group.unplanned_lectures[subject] += 1
+                    affected[id(group)] = group
+        for room in closed_rooms:
+            for slot in range(len(TIME_SLOTS)):
+                if self.room_index.is_free(room, slot):
+                    self.room_index.take(room, slot)
+        self.lecturers = [l for l in self.lecturers if l.name not in absent]
+        self.lecturer_by_name = {l.name: l for l in self.lecturers}
+
+        groups = [affected[key] for key in sorted(affected, key=lambda k: affected[k].id)]
+        for group in groups:
+            for lecturer in self.lecturers:
+                if any(s in lecturer.subjects for s, n in group.unplanned_lectures.items() if n):
+                    self.plan_group_lectures(group, lecturer)
+
+        for _ in range(max_steps):
+            pending = [(g, s) for g in groups for s, n in g.unplanned_lectures.items() if n > 0]
+            if not pending:
+                break
+            group, subject = self.random.choice(pending)
+            lecturers = [l for l in self.lecturers if subject in l.subjects]
+            if not lecturers:
+                continue
+            lecturer, slot = self.random.choice(lecturers), self.random.choice(TIME_SLOTS)
+            lecture = (group, lecturer, slot, subject, None)
+            if not group.is_busy(slot):
+                self.apply_move([], [lecture])
+                continue
+            # move lecture of group from this slot to another one
+            other_subject, name, room = group.busy_time[slot]
+            other_lecturer = self.lecturer_by_name[name]
+            self.apply_move([(group, other_lecturer, slot, other_subject, room)],
+                            [lecture, (group, other_lecturer, self.random.choice(TIME_SLOTS),
+                                       other_subject, room)])
+        return sum(sum(g.unplanned_lectures.values()) for g in self.groups)
+
+
+    def day_cost(self, entity, day, window_penalty):
+        ''' Penalty of soft constraints for one day of group or lecturer '''
+        hours = entity.day_hours(day)
+        if not hours:
+            return 0
+        cost = window_penalty * (max(hours) - min(hours) + 1 - len(hours))
+        cost += TimetablePlanner.LATE_PENALTY * hours.count(len(TimetablePlanner.HOURS) - 1)
+        if day == 'SAT':
+            cost += TimetablePlanner.SATURDAY_PENALTY * len(hours)
+        return cost
+
+    def timetable_cost(self):
+        ''' Total penalty of current timetable, the less the better '''
+        cost = 0
+        for day in TimetablePlanner.WEEK:
+            cost += sum(self.day_cost(g, day, TimetablePlanner.WINDOW_PENALTY)
+                        for g in self.groups)
+            cost += sum(self.day_cost(l, day, TimetablePlanner.LECTURER_WINDOW_PENALTY)
+                        for l in self.lecturers)
+        unplanned = sum(sum(g.unplanned_lectures.values()) for g in self.groups)
+        return cost + TimetablePlanner.UNPLANNED_PENALTY * unplanned
+
+
+    def find_optimal_timetable(self, time_limit=10.0, max_steps=None,
+                               temperature=(10.0, 0.05)):
+        ''' Improves current timetable by simulated annealing (feasible one is
+            created first if nothing is planned yet). Every step tries one of
+            moves keeping all hard constraints: relocation of a lecture to
+            another timeslot, swap of two lectures of a group or planning of
+            a lecture left unplanned. Cost of a move is evaluated only on days
+            it touches. Temperature decreases geometrically from temperature[0]
+            to temperature[1] over max_steps steps if they are given or over
+            time_limit seconds otherwise. Runs bounded by max_steps only
+            (time_limit=None) are exactly reproduced by planner seed.
+            Returns cost of resulting timetable (see timetable_cost).
+        '''
+        if time_limit is None and max_steps is None:
+            raise ValueError('find_optimal_timetable needs time_limit or max_steps')
+        if not any(g.busy_time for g in self.groups):
+            self.create_feasible_timetable()
+        self.lecturer_by_name = {l.name: l for l in self.lecturers}
+
+        cost = best_cost = self.timetable_cost()
+        best = None # snapshot of the best timetable, taken when search leaves it
+        start, step = time.perf_counter(), 0
+        t0, t1 = temperature
+        while True:
+            elapsed = time.perf_counter() - start
+            if time_limit is not None and elapsed >= time_limit:
+                break
+            progress = step / max_steps if max_steps is not None else elapsed / time_limit
+            if progress >= 1:
+                break
+            step += 1
+            move = self.random_move()
+            if move is None:
+                continue
+            removals, additions = move
+            days = self.touched_days(removals + additions)
+            before = self.days_cost(days)
+            done = self.apply_move(removals, additions)
+            if done is None:
+                continue # move breaks hard constraints
+            delta = self.days_cost(days) - before
+            delta -= TimetablePlanner.UNPLANNED_PENALTY * (len(done) - len(removals))
+            t = t0 * (t1 / t0) ** progress
+            if delta <= 0 or self.random.random() < math.exp(-delta / t):
+                if cost == best_cost and delta > 0:
+                    # search leaves the best timetable: snapshot it without the move
+                    self.apply_move(done, removals)
+                    best = self.snapshot()
+                    done = self.apply_move(removals, done)
+                cost += delta
+                if cost < best_cost:
+                    best_cost, best = cost, None
+            else:
+                self.apply_move(done, removals)
+        if best is not None and cost > best_cost:
+            self.restore(best)
+        return best_cost
+
+    def random_move(self):
+        ''' Returns pair (removals, additions) of lectures represented as
+            (group, lecturer, slot, subject, room) tuples. Room None in
+            addition means any free room suitable for subject. '''
+        group = self.random.choice(self.groups)
+        kind = self.random.random()
+        unplanned = [s for s, n in group.unplanned_lectures.items() if n > 0]
+        if unplanned and kind < 0.2:
+            subject = self.random.choice(unplanned)
+            lecturers = [l for l in self.lecturers if subject in l.subjects]
+            if not lecturers:
+                return None
+            return [], [(group, self.random.choice(lecturers),
+                         self.random.choice(TIME_SLOTS), subject, None)]
+        if not group.busy_time:
+            return None
+        slot = self.random.choice(list(group.busy_time))
+        subject, name, room = group.busy_time[slot]
+        lecturer = self.lecturer_by_name[name]
+        lecture = (group, lecturer, slot, subject, room)
+        if kind < 0.6:
+            other = self.random.choice(TIME_SLOTS)
+            return [lecture], [(group, lecturer, other, subject, room)]
+        other = self.random.choice(list(group.busy_time))
+        other_subject, other_name, other_room = group.busy_time[other]
+        other_lecturer = self.lecturer_by_name[other_name]
+        if other == slot:
+            return None
+        return ([lecture, (group, other_lecturer, other, other_subject, other_room)],
+                [(group, lecturer, other, subject, room),
+                 (group, other_lecturer, slot, other_subject, other_room)])
+
+    def apply_move(self, removals, additions):
+        ''' Removes and then adds lectures if all hard constraints hold. Returns
+            list of added lectures (with actual rooms) or None if move is
+            impossible, in that case timetable is left unchanged. '''
+        for lecture in removals:
+            self.unplace(*lecture)
+            lecture[0].unplanned_lectures[lecture[3]] += 1
+        done = []
+        for group, lecturer, slot, subject, room in additions:
+            room = self.choose_room(group, lecturer, slot, subject, room)
+            if room is None:
+                for lecture in done:
+                    self.unplace(*lecture)
+                    lecture[0].unplanned_lectures[lecture[3]] += 1
+                for lecture in removals:
+                    self.place(*lecture)
+                    lecture[0].unplanned_lectures[lecture[3]] -= 1
+                return None
+            self.place(group, lecturer, slot, subject, room)
+            group.unplanned_lectures[subject] -= 1
+            done.append((group, lecturer, slot, subject, room))
+        return done
+
+    def choose_room(self, group, lecturer, slot, subject, preferred):
+        ''' Room for lecture in slot or None if any hard constraint is broken '''
+        if group.is_busy(slot) or lecturer.is_busy(slot):
+            return None
+        if group.lecture_quantity(slot[0]) >= TimetablePlanner.MAX_DAY_LECTURES:
+            return None
+        if preferred is not None and self.room_index.is_free(preferred, SLOT_INDEX[slot]):
+            return preferred
+        return self.room_index.random_free(subject, SLOT_INDEX[slot], self.random)
+
+    def touched_days(self, lectures):
+        days = {}
+        for group, lecturer, slot, _, _ in lectures:
+            days[id(group), slot[0]] = (group, slot[0], TimetablePlanner.WINDOW_PENALTY)
+            days[id(lecturer), slot[0]] = (lecturer, slot[0],
+                                           TimetablePlanner.LECTURER_WINDOW_PENALTY)
+        return list(days.values())
+
+    def days_cost(self, days):
+        return sum(self.day_cost(entity, day, penalty)
+                   for entity, day, penalty in days)
+
+    def snapshot(self):
+        return ([(dict(g.busy_time), dict(g.unplanned_lectures)) for g in self.groups],
+                [dict(l.busy_time) for l in self.lecturers],
+                [set(rooms) for rooms in self.taken_rooms])
+
+    def restore(self, snapshot):
+        groups, lecturers, taken_rooms = snapshot
+        self.room_index.reset(taken_rooms)
+        for g, (busy_time, unplanned) in zip(self.groups, groups):
+            g.reset(busy_time)
+            g.unplanned_lectures = unplanned
+        for l, busy_time in zip(self.lecturers, lecturers):
+            l.reset(busy_time)
 
 
     def damp_timetable(self, filename):
-        ''' Creates file in .ods format with selected name for timetable keeping. '''
-        group_names = sorted([g.id for g in self.groups])
-        week, hours = TimetablePlanner.WEEK, TimetablePlanner.HOURS + ['6th']
-        time_slots = [(d, h) for d in week for h in hours]
-
-        ods = ezodf.newdoc(doctype='ods', filename=filename)
-        sheet = ezodf.Sheet('Timetable', size=(37, 6))
-        ods.sheets += sheet
-
-        coords = [str(r) + str(c) for r in 'ABCDEF' for c in range(2, 38)]
-        headers = [c + '1' for c in 'ABCDEF']
-
-        for header, name in zip(headers, group_names):
-            sheet[header].set_value(name)
-        start, end = 0, 36
-        for g in sorted(self.groups, key=lambda x: x.id):
-            for (coord, timeslot) in zip(coords[start:end], time_slots):
-                if timeslot in g.busy_time:
-                    sheet[coord].set_value(g.busy_time[timeslot][0])
-            start, end = end, end + 36
-        ods.save()
+        ''' Saves timetable of groups, lecturers and rooms to .ods, .csv
+            or .json file (chosen by extension), see export module. '''
+        from export import export_timetable
+        export_timetable(self, filename)
 
 
     def print_group_timetable(self, group):
@@ -0,0 +1,116 @@
+""" Statistics and profiling hooks for CSP solvers """
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+def profiled(csp, stats):
+    ''' stats.watching(csp) or no-op context when stats is None '''
+    return nullcontext() if stats is None else stats.watching(csp)
+
+
+class SearchStats:
+    ''' Counters filled by solvers which get it as stats argument. Without
+        stats solvers don't pay anything but a few "is None" checks.
+
+        checks and prunes count calls of csp.constraints and csp.prune made
+        during the run; answers of csp.has_support count as one check and
+        vectorised csp.conflict_counts as many checks as the scan it
+        replaces (values times assigned neighbors). timings keep seconds spent in every heuristic. If
+        callback is given, it's called with stats every `every` nodes or
+        steps and once more when solver finishes.
+    '''
+    def __init__(self, callback=None, every=1000):
+        self.nodes = 0       # nodes expanded by BacktrackingSearch
+        self.backtracks = 0  # nodes whose values all failed
+        self.steps = 0       # iterations of local search
+        self.revisions = 0   # arcs revised by AC3
+        self.checks = 0      # constraint checks
+        self.prunes = 0      # values removed from domains
+        self.best = None     # best value of csp.preferences() found
+        self.elapsed = 0.0
+        self.timings = defaultdict(float)
+        self.callback, self.every = callback, every
+
+    def node(self):
+        self.nodes += 1
+        if self.callback is not None and self.nodes % self.every == 0:
+            self.callback(self)
+
+    def step(self):
+        self.steps += 1
+        if self.callback is not None and self.steps % self.every == 0:
+            self.callback(self)
+
+    @property
+    def steps_per_second(self):
+        return (self.steps or self.nodes) / self.elapsed if self.elapsed else 0.0
+
+    def timed(self, name, function):
+        ''' Wraps function so that time spent in it is added to timings[name] '''
+        timings = self.timings
+        def wrapper(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                timings[name] += time.perf_counter() - start
+        return wrapper
+
+    @contextmanager
+    def watching(self, csp):
+        ''' Counts constraint checks and prunes of csp and measures elapsed
+            time while active. Counting wrappers shadow methods of csp instance
+            and are removed on exit. '''
+        names = ('constraints', 'prune', 'has_support', 'conflict_counts')
+        shadowed = {name: csp.__dict__.get(name) for name in names}
+        constraints, prune = csp.constraints, csp.prune
+        has_support, conflict_counts = csp.has_support, csp.conflict_counts
+
+        def counted_constraints(*args):
+            self.checks += 1
+            return constraints(*args)
+
+        def counted_has_support(X, x, Y):
+            answer = has_support(X, x, Y)
+            if answer is not None: # otherwise caller scans Y by csp.constraints
+                self.checks += 1
+            return answer
+
+        def counted_conflict_counts(X):
+            checks = self.checks
+            counts = conflict_counts(X)
+            if self.checks == checks: # vectorised, csp.constraints wasn't called
+                self.checks += len(X.curr_domain) * sum(Y.isassigned() for Y in X.neighbors)
+            return counts
+
+        def counted_prune(var, value):
+            self.prunes += 1
+            prune(var, value)
+
+        csp.constraints, csp.prune = counted_constraints, counted_prune
+        csp.has_support, csp.conflict_counts = counted_has_support, counted_conflict_counts
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.elapsed += time.perf_counter() - start
+            for name, method in shadowed.items():
+                if method is None:
+                    delattr(csp, name)
+                else:
+                    setattr(csp, name, method)
+            if self.callback is not None:
+                self.callback(self)
+
+    def report(self):
+        return {
+            'nodes': self.nodes, 'backtracks': self.backtracks, 'steps': self.steps,
+            'revisions': self.revisions, 'checks': self.checks, 'prunes': self.prunes,
+            'best': self.best, 'elapsed': self.elapsed,
+            'steps_per_second': self.steps_per_second, 'timings': dict(self.timings)
+        }
+
+    def __str__(self):
+        return ', '.join('{}={}'.format(k, v) for k, v in self.report().items())
@@ -0,0 +1,74 @@
+""" On-disk snapshots of data loaded from university database """
+
+import hashlib
+import os
+import pickle
+from collections import namedtuple
+
+
+Dataset = namedtuple('Dataset', ['groups', 'teachers', 'rooms'])
+
+# row counts and maximal ids of these tables are version of snapshot
+VERSION_TABLES = ('specialities', 'groups', 'disciplines', 'departments',
+                  'teachers', 'exercises', 'rooms')
+FORMAT = 1 # is increased when layout of Dataset changes
+
+
+class SnapshotCache:
+    ''' Directory of pickled datasets. File name is a hash of the key, file
+        keeps key, version and data, so stale or colliding files are ignored.
+    '''
+    def __init__(self, directory='snapshots'):
+        self.directory = directory
+
+    def path(self, key):
+        digest = hashlib.sha1(repr((FORMAT, key)).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.pickle')
+
+    def load(self, key, version=None):
+        ''' Cached data or None. With version=None any cached version fits. '''
+        try:
+            with open(self.path(key), 'rb') as f:
+                stored_key, stored_version, data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        if stored_key != key or (version is not None and stored_version != version):
+            return None
+        return data
+
+    def store(self, key, version, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'wb') as f:
+            pickle.dump((key, version, data), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path) # readers never see a half-written file
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.pickle'):
+                    os.remove(os.path.join(self.directory, name))
+
+
+def load_dataset(database, inst_id, buildings=(), semesters=(), cache=None, check=True):
+    ''' Dataset(groups, teachers, rooms) of institute: groups and teachers as
+        UniversityDatabase.load_institute returns, rooms as {building id:
+        [Room]}. It's taken from cache if database hasn't changed since it
+        was stored (see UniversityDatabase.row_counts); with check=False
+        cached data is returned without touching database at all.
+    '''
+    cache = cache or SnapshotCache()
+    key = (database.data.host, database.data.dbname, inst_id,
+           tuple(sorted(buildings)), tuple(sorted(semesters)))
+    version = database.row_counts(VERSION_TABLES) if check else None
+    data = cache.load(key, version)
+    if data is not None:
+        return data
+    if version is None:
+        version = database.row_counts(VERSION_TABLES)
+    groups, teachers = database.load_institute(inst_id, tuple(semesters))
+    data = Dataset(groups, teachers,
+                   {b: list(database.get_rooms_in_building(b)) for b in buildings})
+    cache.store(key, version, data)
+    return data
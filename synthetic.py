@@ -0,0 +1,130 @@
+""" Synthetic university of any size for planners, without database """
+
+import math
+import random
+from collections import defaultdict
+
+from csp import TimetablePlanner2
+from dbconnect import Teacher, Group, Exercise, Room
+from planner import TimetablePlanner, Constraint, Lecturer, SubjectType
+from planner import Group as PlannerGroup
+
+
+TYPES = ['lecture', 'practice'] # lecture is common for groups of speciality
+SUBJECT_TYPES = {'lecture': SubjectType.stream_lecture, 'practice': SubjectType.practice}
+WEEK_SLOTS = len(TimetablePlanner.WEEK) * len(TimetablePlanner.HOURS)
+
+
+class SyntheticUniversity:
+    ''' Random university with the same shape as data of UniversityDatabase:
+
+        groups    - {Group(speciality id, name, size): [(discipline id, name)]}
+                    as get_disciplines_for_groups returns
+        teachers  - [(Teacher, {Exercise(id, type, discipline name): hours})]
+                    as get_teachers_hours_for_institute returns
+        rooms     - {building id: [Room(id, name, type, size)]}
+        room_domains - {(discipline name, type): [room names]}
+
+        Every institute has its own building. Lecture of discipline is given
+        once for all groups of speciality, practice is given to every group
+        separately but is one subject of TimetablePlanner2 as well (its
+        listeners are all groups of speciality). lectures is the number of
+        variables of TimetablePlanner2, TimetablePlanner gets about
+        groups_per_speciality times more lectures since it plans every
+        group on its own. Equal seeds give equal universities.
+    '''
+    def __init__(self, lectures=1000, seed=None, groups_per_speciality=3,
+                 disciplines_per_speciality=5, hours=(1, 2), teacher_load=(8, 20),
+                 specialities_per_institute=4, rooms_per_subject=4, room_slack=1.5):
+        rng = random.Random(seed)
+        self.groups, self.teachers, self.rooms, self.room_domains = {}, [], {}, {}
+        self.speciality_groups = defaultdict(list) # speciality id -> group names
+        exercises = [] # (institute, speciality, discipline id, name, type, hours)
+
+        total, spec_id, discipline_id = 0, 0, 0
+        while total < lectures:
+            spec_id += 1
+            institute = (spec_id - 1) // specialities_per_institute + 1
+            disciplines = []
+            for _ in range(disciplines_per_speciality):
+                discipline_id += 1
+                name = 'Дисциплина-{}-{}'.format(spec_id, discipline_id)
+                disciplines.append((discipline_id, name))
+                for type in TYPES:
+                    n = min(rng.randint(*hours), lectures - total)
+                    if n > 0:
+                        exercises.append((institute, spec_id, discipline_id, name, type, n))
+                        total += n
+            for _ in range(groups_per_speciality):
+                group_name = 'гр. {}'.format(1000 + len(self.groups) + 1)
+                self.groups[Group(spec_id, group_name, rng.randint(15, 30))] = disciplines
+                self.speciality_groups[spec_id].append(group_name)
+
+        # teachers of institute take exercises until their load (in lectures
+        # of TimetablePlanner, i.e. per group) is reached
+        by_institute = defaultdict(list)
+        for exercise in exercises:
+            by_institute[exercise[0]].append(exercise)
+        teacher_id, exercise_id, room_id = 0, 0, 0
+        for institute, items in sorted(by_institute.items()):
+            teacher, load, limit = None, 0, 0
+            for _, spec, _, name, type, n in items:
+                weight = n * len(self.speciality_groups[spec])
+                if teacher is None or load + weight > limit:
+                    teacher_id += 1
+                    teacher = (Teacher(teacher_id, 'Иван', 'Петрович', 'Преподаватель-{}'.format(teacher_id)), {})
+                    self.teachers.append(teacher)
+                    load, limit = 0, max(rng.randint(*teacher_load), weight)
+                exercise_id += 1
+                teacher[1][Exercise(exercise_id, type, name)] = n
+                load += weight
+
+            # enough rooms of every type for all lectures of institute
+            self.rooms[institute] = []
+            for type in TYPES:
+                weight = sum(n * len(self.speciality_groups[spec])
+                             for _, spec, _, _, t, n in items if t == type)
+                count = max(rooms_per_subject, math.ceil(weight * room_slack / WEEK_SLOTS))
+                size = (60, 120) if type == 'lecture' else (15, 30)
+                for i in range(count):
+                    room_id += 1
+                    name = '{}-{}{}'.format(institute, type[0].upper(), i + 1) # e.g. 2-L14
+                    self.rooms[institute].append(Room(room_id, name, type, rng.randint(*size)))
+                rooms = [r.name for r in self.rooms[institute] if r.type == type]
+                for _, _, _, name, t, _ in items:
+                    if t == type:
+                        self.room_domains[name, type] = sorted(rng.sample(rooms, rooms_per_subject))
+
+    def __len__(self):
+        ''' Number of lectures (variables of TimetablePlanner2) '''
+        return sum(sum(hours.values()) for _, hours in self.teachers)
+
+    def csp_inputs(self):
+        ''' (lecturer_hours, group_disciplines, room_domains) for TimetablePlanner2 '''
+        lecturer_hours = {teacher.lastname: {(e.name, e.type): n for e, n in hours.items()}
+                          for teacher, hours in self.teachers}
+        taught = {subject for hours in lecturer_hours.values() for subject in hours}
+        group_disciplines = {group.name: [(name, type) for _, name in disciplines for type in TYPES
+                                          if (name, type) in taught]
+                             for group, disciplines in self.groups.items()}
+        return lecturer_hours, group_disciplines, dict(self.room_domains)
+
+    def csp(self):
+        return TimetablePlanner2(*self.csp_inputs())
+
+    def planner_inputs(self):
+        ''' (constraints, groups, lecturers) for TimetablePlanner, subjects
+            are named "discipline type" '''
+        subject = '{} {}'.format
+        hours = {(e.name, e.type): n for _, exercises in self.teachers for e, n in exercises.items()}
+        constraints = {subject(*key): Constraint(list(self.room_domains[key]), SUBJECT_TYPES[key[1]])
+                       for key in hours}
+        groups = [PlannerGroup(group.name, {subject(*key): hours[key] for _, name in disciplines
+                                            for key in ((name, t) for t in TYPES) if key in hours})
+                  for group, disciplines in self.groups.items()]
+        lecturers = [Lecturer(teacher.lastname, [subject(e.name, e.type) for e in exercises])
+                     for teacher, exercises in self.teachers]
+        return constraints, groups, lecturers
+
+    def planner(self, seed=None):
+        return TimetablePlanner(*self.planner_inputs(), seed=seed)
@@ -0,0 +1,270 @@
+import os
+import random
+import subprocess
+import sys
+import time
+import unittest
+from csp import Sudoku, MapColoring, TimetablePlanner2
+from algorithms import *
+from profiling import SearchStats
+from synthetic import SyntheticUniversity
+
+EASY_SUDOKU = '..3.2.6..9..3.5..1..18.64....81.29..7.......8..67.82....26.95..8..2.3..9..5.1.3..'
+HARD_SUDOKU = '4173698.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......'
+
+
+def full_violation_list(csp):
+    return [var for var in csp.variables
+            if var.isassigned() and csp.conflicts(var, var.curr_value) > 0]
+
+
+class ConflictTableTestCase(unittest.TestCase):
+    def setUp(self):
+        random.seed(7)
+        self.csp = TimetablePlanner2()
+        self.csp.setup_constraints()
+
+    def test_counts_follow_assignments(self):
+        table = self.csp.attach(ConflictTable)
+        for _ in range(500):
+            var = random.choice(self.csp.variables)
+            if random.random() < 0.2:
+                var.unassign()
+            else:
+                var.assign(random.choice(list(var.curr_domain)))
+        self.assertEqual({id(v) for v in table.violated},
+                         {id(v) for v in full_violation_list(self.csp)})
+        for var in self.csp.assignment:
+            self.assertEqual(table.counts[id(var)],
+                             self.csp.conflicts(var, var.curr_value))
+
+    def test_solvers_detach_their_watchers(self):
+        table = self.csp.attach(ConflictTable)
+        min_conflicts(self.csp, max_steps=50, rng=random.Random(1))
+        iterative_forward_search(self.csp, max_steps=50, rng=random.Random(1))
+        self.assertTrue(all(var.watchers == [table] for var in self.csp.variables))
+        self.csp.detach(ConflictTable)
+        repair(self.csp, min_conflicts(self.csp, rng=random.Random(1)), {}, rng=random.Random(1))
+        sudoku = Sudoku(EASY_SUDOKU)
+        BacktrackingSearch(sudoku, minimum_remaining_value)
+        for csp in (self.csp, sudoku):
+            self.assertTrue(all(var.watchers == [] for var in csp.variables))
+
+
+class AC3TestCase(unittest.TestCase):
+    def domains(self, csp):
+        return [list(v.curr_domain) for v in csp.variables]
+
+    def test_specialised_support_agrees_with_scan(self):
+        random.seed(3)
+        fast, slow = TimetablePlanner2(), TimetablePlanner2()
+        fast.setup_constraints()
+        slow.setup_constraints()
+        slow.has_support = lambda X, x, Y: None
+        for i in random.sample(range(len(fast.variables)), 20):
+            for value in list(fast.variables[i].curr_domain)[3:]:
+                fast.prune(fast.variables[i], value)
+                slow.prune(slow.variables[i], value)
+        self.assertEqual(AC3(fast), AC3(slow))
+        self.assertEqual(self.domains(fast), self.domains(slow))
+
+    def test_specialised_checks_are_counted(self):
+        fast, slow = TimetablePlanner2(), TimetablePlanner2()
+        fast.setup_constraints()
+        slow.setup_constraints()
+        slow.has_support = lambda X, x, Y: None
+        slow.conflict_counts = lambda X: [slow.conflicts(X, x) for x in X.curr_domain]
+        local, arcs = [], []
+        for csp in (fast, slow):
+            stats = SearchStats()
+            min_conflicts(csp, max_steps=50, stats=stats, rng=random.Random(1))
+            local.append(stats.checks)
+            csp.load_assignment({})
+            stats = SearchStats()
+            AC3(csp, stats=stats)
+            arcs.append(stats.checks)
+        self.assertEqual(local[0], local[1]) # vectorised counts replace the same checks
+        self.assertGreater(arcs[0], 0)
+        self.assertLessEqual(arcs[0], arcs[1])
+
+    def test_sudoku(self):
+        sudoku = Sudoku(EASY_SUDOKU)
+        self.assertTrue(AC3(sudoku))
+        self.assertTrue(all(len(v.curr_domain) == 1 for v in sudoku.variables))
+
+
+def slow_min_conflicts(csp, rng):
+    ''' min_conflicts which stalls for a minute in some runs '''
+    if rng.random() > 0.5: # seed 0
+        time.sleep(60)
+    return min_conflicts(csp, rng=rng)
+
+
+class MinConflictsTestCase(unittest.TestCase):
+    def australia(self):
+        return MapColoring(list('RGB'), {
+            'SA':  ['WA', 'NT', 'Q', 'NSW', 'V'],
+            'WA':  ['SA', 'NT'],
+            'Q' :  ['SA', 'NT', 'NSW'],
+            'NT':  ['SA', 'WA', 'Q'],
+            'NSW': ['SA', 'Q', 'V'],
+            'V':   ['SA', 'NSW'],
+            'T':   []
+        })
+
+    def test_map_coloring(self):
+        random.seed(1)
+        australia = self.australia()
+        assignment = min_conflicts(australia)
+        self.assertIsNotNone(assignment)
+        self.assertFalse(full_violation_list(australia))
+
+    def test_seeded_runs_are_reproducible(self):
+        for seed in range(5):
+            first = min_conflicts(self.australia(), rng=random.Random(seed))
+            random.seed(seed + 1) # global state doesn't matter
+            self.assertEqual(min_conflicts(self.australia(), rng=random.Random(seed)), first)
+
+    def test_seeded_runs_do_not_depend_on_hash_seed(self):
+        script = ('import random; from algorithms import min_conflicts; '
+                  'from synthetic import SyntheticUniversity; '
+                  'csp = SyntheticUniversity(100, seed=1).csp(); csp.setup_constraints(); '
+                  'print(sorted(min_conflicts(csp, rng=random.Random(3)).items()))')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        outputs = [subprocess.run([sys.executable, '-c', script], cwd=root, check=True,
+                                  stdout=subprocess.PIPE, universal_newlines=True,
+                                  env=dict(os.environ, PYTHONHASHSEED=seed)).stdout
+                   for seed in ('1', '2')]
+        self.assertEqual(*outputs)
+
+    def test_multistart_search(self):
+        australia = self.australia()
+        assignment = multistart_search(australia, seeds=range(4), max_workers=2,
+                                       first_feasible=False)
+        self.assertIsNotNone(assignment)
+        self.assertTrue(australia.isfeasible())
+        self.assertEqual(australia.preferences(), 1) # Tasmania is blue in the best plan
+
+    def test_first_feasible_stops_other_runs(self):
+        australia, start = self.australia(), time.perf_counter()
+        assignment = multistart_search(australia, solver=slow_min_conflicts,
+                                       seeds=range(2), max_workers=2)
+        self.assertIsNotNone(assignment)
+        self.assertLess(time.perf_counter() - start, 30)
+
+
+class RepairTestCase(unittest.TestCase):
+    def test_closed_room(self):
+        csp = SyntheticUniversity(300, seed=2).csp()
+        csp.setup_constraints()
+        assignment = min_conflicts(csp, rng=random.Random(2))
+        closed = assignment[str(csp.variables[0])][1]
+        forbidden = {str(v): [value for value in v.curr_domain if value[1] == closed]
+                     for v in csp.variables if closed in v.possible_rooms}
+        affected = [name for name in forbidden if assignment[name][1] == closed]
+        stats = SearchStats()
+        repaired = repair(csp, assignment, forbidden, stats=stats, rng=random.Random(2))
+        self.assertIsNotNone(repaired)
+        self.assertTrue(csp.isfeasible())
+        self.assertNotIn(closed, [room for _, room in repaired.values()])
+        changed = [name for name in assignment if repaired[name] != assignment[name]]
+        self.assertLessEqual(len(changed), 2 * len(affected))
+        # lectures keep their time when another room is free
+        self.assertTrue(any(repaired[name][0] == assignment[name][0] for name in affected))
+        self.assertIn('least_change_value', stats.timings)
+
+    def test_impossible_repair_leaves_csp_untouched(self):
+        csp = SyntheticUniversity(100, seed=2).csp()
+        csp.setup_constraints()
+        assignment = min_conflicts(csp, rng=random.Random(2))
+        var = csp.variables[0]
+        domains = [list(v.curr_domain) for v in csp.variables]
+        forbidden = {str(var): list(var.curr_domain)}
+        self.assertIsNone(repair(csp, assignment, forbidden, rng=random.Random(2)))
+        self.assertEqual([list(v.curr_domain) for v in csp.variables], domains)
+        self.assertEqual({str(v): v.curr_value for v in csp.variables}, assignment)
+
+
+class BacktrackingSearchTestCase(unittest.TestCase):
+    def check_solved(self, sudoku):
+        self.assertEqual(len(sudoku.assignment), 81)
+        self.assertFalse(full_violation_list(sudoku))
+
+    def test_forward_checking(self):
+        sudoku = Sudoku(EASY_SUDOKU)
+        self.assertTrue(BacktrackingSearch(sudoku))
+        self.check_solved(sudoku)
+
+    def test_maintain_arc_consistency(self):
+        sudoku = Sudoku(EASY_SUDOKU)
+        self.assertTrue(BacktrackingSearch(sudoku, inference=maintain_arc_consistency))
+        self.check_solved(sudoku)
+
+    def test_minimum_remaining_value(self):
+        sudoku = Sudoku(HARD_SUDOKU)
+        self.assertTrue(BacktrackingSearch(
+            sudoku, select_unassigned_variable=minimum_remaining_value))
+        self.check_solved(sudoku)
+
+    def test_minimum_remaining_value_follows_prunes(self):
+        sudoku = Sudoku(HARD_SUDOKU)
+        for var in sudoku.variables:
+            if len(var.curr_domain) == 1:
+                var.assign(next(iter(var.curr_domain)))
+        smallest = lambda: min(len(v.curr_domain) for v in sudoku.variables
+                               if v.isunassigned())
+        self.assertEqual(len(minimum_remaining_value(sudoku).curr_domain), smallest())
+        sudoku.checkpoint()
+        var = next(v for v in sudoku.variables if v.isunassigned())
+        for value in list(var.curr_domain)[1:]:
+            sudoku.prune(var, value)
+        self.assertIs(minimum_remaining_value(sudoku), var)
+        sudoku.backtrack()
+        self.assertEqual(len(minimum_remaining_value(sudoku).curr_domain), smallest())
+
+    def test_degree_counts_unassigned_neighbors(self):
+        csp = MapColoring(list('RGB'), {'A': ['B', 'C', 'D'], 'B': ['A'], 'C': ['A'], 'D': ['A'],
+                                        'E': ['F', 'G'], 'F': ['E'], 'G': ['E']})
+        self.assertEqual(str(minimum_remaining_value(csp)), 'A')
+        for var in csp.variables:
+            if str(var) in 'BCD':
+                var.assign('R')
+        self.assertEqual(str(minimum_remaining_value(csp)), 'E')
+
+    def test_search_is_not_limited_by_recursion(self):
+        n = 40 # king's graph of 1600 cells, more than default recursion limit
+        cell = '{}.{}'.format
+        csp = MapColoring(list('RGBY'), {
+            cell(i, j): [cell(i + di, j + dj) for di in (-1, 0, 1) for dj in (-1, 0, 1)
+                         if (di or dj) and 0 <= i + di < n and 0 <= j + dj < n]
+            for i in range(n) for j in range(n)})
+        self.assertGreater(len(csp.variables), sys.getrecursionlimit())
+        self.assertTrue(BacktrackingSearch(csp, minimum_remaining_value))
+        self.assertTrue(csp.isfeasible())
+
+    def test_stats(self):
+        sudoku, stats = Sudoku(HARD_SUDOKU), SearchStats()
+        self.assertTrue(BacktrackingSearch(
+            sudoku, select_unassigned_variable=minimum_remaining_value, stats=stats))
+        self.assertEqual(stats.nodes - stats.backtracks, 81) # nodes of the solution path
+        self.assertGreater(stats.checks, 0)
+        self.assertGreater(stats.prunes, 0)
+        self.assertIn('inference', stats.timings)
+        self.assertNotIn('constraints', sudoku.__dict__) # counting wrappers are removed
+
+    def test_backtrack_restores_order(self):
+        sudoku = Sudoku(EASY_SUDOKU)
+        var = next(v for v in sudoku.variables if len(v.curr_domain) == 9)
+        sudoku.checkpoint()
+        for value in '7315':
+            sudoku.prune(var, value)
+        sudoku.checkpoint()
+        sudoku.prune(var, '9')
+        sudoku.backtrack()
+        self.assertEqual(list(var.curr_domain), list('24689'))
+        sudoku.backtrack()
+        self.assertEqual(list(var.curr_domain), list('123456789'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import pickle
+import random
+import unittest
+from csp import CSP, Variable, Sudoku, TimetablePlanner2
+from compact import CompactCSP
+from algorithms import min_conflicts, BacktrackingSearch
+
+
+class Staircase(CSP):
+    ''' Chain of variables with increasing values, constraint has no kind '''
+    def __init__(self, n):
+        super().__init__()
+        for i in range(n):
+            self.add_variable(Variable(list(range(n)), name=str(i)))
+        for X, Y in zip(self.variables, self.variables[1:]):
+            X.neighbors.append(Y)
+            Y.neighbors.append(X)
+
+    def constraints(self, A, a, B, b):
+        return (a < b) == (int(A.name) < int(B.name))
+
+
+class CompactCSPTestCase(unittest.TestCase):
+    def setUp(self):
+        random.seed(2)
+        self.csp = TimetablePlanner2()
+        self.csp.setup_constraints()
+        for X in self.csp.variables[:20]:
+            X.assign(random.choice(list(X.curr_domain)))
+        self.csp.variables[30].curr_domain.remove(self.csp.variables[30].init_domain[0])
+        self.model = pickle.loads(pickle.dumps(CompactCSP(self.csp)))
+
+    def test_rehydrated_csp_has_same_state(self):
+        copy = self.model.to_csp()
+        self.assertEqual(self.model.assignment(), self.csp.infer_assignment())
+        for X, Y in zip(self.csp.variables, copy.variables):
+            self.assertEqual(str(X), str(Y))
+            self.assertEqual(list(X.curr_domain), list(Y.curr_domain))
+            self.assertEqual(len(X.neighbors), len(Y.neighbors))
+
+    def test_rehydrated_constraints(self):
+        copy = self.model.to_csp()
+        for X, CX in zip(self.csp.variables, copy.variables):
+            for Y, CY in zip(X.neighbors, CX.neighbors):
+                for a, b in zip(X.init_domain[::5], Y.init_domain[::3]):
+                    self.assertEqual(self.csp.constraints(X, a, Y, b),
+                                     copy.constraints(CX, a, CY, b))
+
+    def test_solution_of_copy_fits_original(self):
+        random.seed(0)
+        csp = TimetablePlanner2()
+        csp.setup_constraints()
+        assignment = min_conflicts(CompactCSP(csp).to_csp())
+        self.assertIsNotNone(assignment)
+        csp.load_assignment(assignment)
+        self.assertTrue(csp.isfeasible())
+
+    def test_sudoku(self):
+        copy = pickle.loads(pickle.dumps(CompactCSP(Sudoku('.' * 80 + '1')).to_csp()))
+        self.assertEqual(len(copy.variables), 81)
+        self.assertEqual(sum(len(X.neighbors) for X in copy.variables), 81 * 20)
+
+
+    def test_constraints_without_kind(self):
+        csp = Staircase(6)
+        model = pickle.loads(pickle.dumps(CompactCSP(csp)))
+        self.assertEqual(len(model.tables), 2) # to the next and to the previous variable
+        copy = model.to_csp()
+        for X, CX in zip(csp.variables, copy.variables):
+            for Y, CY in zip(X.neighbors, CX.neighbors):
+                for a in X.init_domain:
+                    for b in Y.init_domain:
+                        self.assertEqual(csp.constraints(X, a, Y, b), copy.constraints(CX, a, CY, b))
+        self.assertTrue(BacktrackingSearch(copy))
+        self.assertEqual([X.curr_value for X in copy.variables], list(range(6)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import random
+import unittest
+from csp import CSP, Domain, ScheduleVariable, TimetablePlanner2
+from algorithms import WeightTable
+from utils import bounded_sum
+
+
+class DomainTestCase(unittest.TestCase):
+    def setUp(self):
+        self.domain = Domain('abcde')
+
+    def test_remove_and_restore_keep_order(self):
+        self.domain.remove('b')
+        self.domain.remove('d')
+        self.assertEqual(list(self.domain), ['a', 'c', 'e'])
+        self.assertEqual(len(self.domain), 3)
+        self.assertNotIn('b', self.domain)
+        self.domain.restore('d')
+        self.domain.restore('b')
+        self.assertEqual(list(self.domain), list('abcde'))
+        self.assertRaises(ValueError, self.domain.remove, 'x')
+
+    def test_schedule_domains_are_shared(self):
+        X = ScheduleVariable('Jones', 'Calculus I', {'g1'}, {405, 406})
+        Y = ScheduleVariable('Smith', 'Calculus II', {'g2'}, {406, 405})
+        self.assertIs(X.curr_domain.values, Y.curr_domain.values)
+        X.curr_domain.remove(X.init_domain[0])
+        self.assertEqual(len(X.curr_domain) + 1, len(Y.curr_domain))
+
+
+class TimetablePlanner2TestCase(unittest.TestCase):
+    def setUp(self):
+        self.csp = TimetablePlanner2()
+        self.csp.setup_constraints()
+
+    def test_neighbors_match_pairwise_definition(self):
+        for X in self.csp.variables:
+            expected = [id(Y) for Y in self.csp.variables if Y is not X and
+                        (X.samelecturers(Y) or X.samerooms(Y) or X.samelisteners(Y))]
+            self.assertEqual([id(Y) for Y in X.neighbors], expected)
+
+    def test_vectorised_conflict_counts(self):
+        random.seed(5)
+        for X in self.csp.variables:
+            if random.random() < 0.7:
+                X.assign(random.choice(X.init_domain))
+            elif random.random() < 0.5:
+                for value in random.sample(X.init_domain, 10):
+                    X.curr_domain.remove(value)
+        for X in self.csp.variables:
+            self.assertEqual(list(self.csp.conflict_counts(X)),
+                             CSP.conflict_counts(self.csp, X))
+
+    def test_weight_table(self):
+        random.seed(11)
+        table = self.csp.attach(WeightTable)
+        for _ in range(300):
+            X = random.choice(self.csp.variables)
+            if random.random() < 0.1:
+                X.unassign()
+            else:
+                X.assign(random.choice(X.init_domain))
+            weights = [self.csp.weight(v) for v in self.csp.variables]
+            self.assertEqual(self.csp.preferences(), bounded_sum(weights))
+            heaviest = weights.index(max(weights))
+            self.assertIs(table.heaviest(), self.csp.variables[heaviest])
+        empty = CSP()
+        empty.weight = lambda var: 0
+        self.assertIsNone(empty.attach(WeightTable).heaviest())
+
+    def test_setup_constraints_is_idempotent(self):
+        degrees = [len(X.neighbors) for X in self.csp.variables]
+        self.csp.setup_constraints()
+        self.assertEqual([len(X.neighbors) for X in self.csp.variables], degrees)
+
+    def test_empty_inputs_are_not_replaced_by_fixtures(self):
+        empty = TimetablePlanner2({}, {}, {})
+        self.assertEqual(len(empty.variables), 0)
+        self.assertEqual(len(TimetablePlanner2(group_disciplines={}).variables),
+                         len(self.csp.variables))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,107 @@
+import os
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from dbconnect import *
 
 
+def fill_sample_university(backend):
+    ''' Two institutes with specialities, groups, disciplines and teachers '''
+    backend.create_schema()
+    connection = backend.connect()
+    connection.executemany("insert into institutes (id, name) values (?, ?)",
+                           [(1, 'Математический'), (2, 'Политехнический')])
+    connection.executemany("insert into departments (id, institute_id, name) values (?, ?, ?)",
+                           [(1, 1, 'Прикладная математика'), (2, 2, 'АСОИУ')])
+    connection.executemany("insert into specialities (id, institute_id, name) values (?, ?, ?)",
+                           [(1, 1, 'Математическое моделирование'), (2, 2, 'ПОВТиАС'), (3, 2, 'УИТС')])
+    connection.executemany("insert into groups (id, speciality_id, name, size) values (?, ?, ?, ?)",
+                           [(1, 1, 'гр. 1001', 20), (2, 2, 'гр. 1002', 25), (3, 3, 'гр. 1003', 15)])
+    connection.executemany("insert into disciplines (id, speciality_id, name, semestr) values (?, ?, ?, ?)",
+                           [(d, s, 'Дисциплина-{}{}'.format(s, d), d % 4)
+                            for s in (1, 2, 3) for d in range(s * 10, s * 10 + 6)])
+    connection.executemany("insert into teachers (id, department_id, firstname, middlename, lastname) "
+                           "values (?, ?, ?, ?, ?)",
+                           [(t, 1 + t % 2, 'Иван', 'Петрович', 'Сидоров-{}'.format(t)) for t in range(1, 7)])
+    connection.executemany("insert into exercises (teacher_id, discipline_id, type_id, hours) "
+                           "values (?, ?, ?, ?)",
+                           [(1 + d % 6, d, 1 + d % 3, 2 + d % 3) for s in (1, 2, 3)
+                            for d in range(s * 10, s * 10 + 6)])
+    connection.executemany("insert into rooms (building_id, name, process_type_id, size) "
+                           "values (?, ?, ?, ?)",
+                           [(b, str(f * 100 + r), 1, 20) for b in (1, 2)
+                            for f in range(1, 4) for r in range(1, 6)])
+    connection.commit()
+    connection.close()
+
+
 class UnivercityDatabaseTestCase(unittest.TestCase):
     def setUp(self):
-        self.database = UniversityDatabase(ConnData('localhost', 'work', '123', 'univercity'))
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        backend = SQLiteBackend(self.path)
+        fill_sample_university(backend)
+        self.database = UniversityDatabase(backend)
+
+    def tearDown(self):
+        self.database.close()
+        os.remove(self.path)
+
+    def test_get_disciplines_for_groups(self):
+        for semesters in ((), (1, 2)):
+            expected = dict(self.database.get_disciplines_for_group(id, semesters) for id in (1, 2, 3))
+            self.assertEqual(self.database.get_disciplines_for_groups([1, 2, 3], semesters), expected)
+        group, disciplines = self.database.get_disciplines_for_group(2, (1,))
+        self.assertEqual(group, Group(2, 'гр. 1002', 25))
+        self.assertEqual([d for d, _ in disciplines], [20, 21, 24, 25])
+
+    def test_get_teachers_hours_for_institute(self):
+        for semesters in ((), (3,)):
+            bulk = list(self.database.get_teachers_hours_for_institute(2, semesters))
+            self.assertEqual([t.id for t, _ in bulk], [1, 3, 5])
+            for teacher, hours in bulk:
+                self.assertEqual((teacher, hours),
+                                 self.database.get_teacher_hours(teacher.id, semesters))
+
+    def test_streams(self):
+        self.database.close()
+        self.database = UniversityDatabase(self.database.backend, pool_size=2, batch_size=1)
+        groups = list(self.database.stream_institute_groups(2, (1,)))
+        self.assertEqual(dict(groups), self.database.get_disciplines_for_groups([2, 3], (1,)))
+        # nested iterators have their own cursors
+        pairs = [(room.name, teacher.id) for room in self.database.get_rooms_in_building(1)
+                 for teacher, _ in self.database.get_teachers_hours_for_institute(1)]
+        self.assertEqual(len(pairs), 15 * 3)
+        # abandoned iterator gives its connection back
+        rooms = self.database.get_rooms_in_building(2)
+        next(rooms)
+        rooms.close()
+        self.assertEqual(self.database.pool.idle.qsize(), 2)
+
+    def test_exhausted_pool_raises(self):
+        self.database.close()
+        self.database = UniversityDatabase(self.database.backend, pool_size=2,
+                                           batch_size=1, pool_timeout=0.1)
+        first, second = self.database.get_rooms_in_building(1), self.database.get_rooms_in_building(2)
+        next(first), next(second)
+        self.assertRaises(PoolExhausted, next, self.database.get_rooms_in_building(1))
+        first.close()
+        self.assertEqual(next(self.database.get_rooms_in_building(1)).name, '101')
+        second.close()
+        self.assertEqual(dict(self.database.stream_teacher_hours(1)),
+                         self.database.get_teacher_hours(1)[1])
+
+    def test_parameters_are_not_interpolated(self):
+        self.assertEqual(self.database.rows("select name from groups where name = ?",
+                                            ("x' or '1' = '1",)), [])
+        self.assertRaises(DatabaseError, self.database.rows, "select * from nowhere")
+
+    def test_concurrent_loaders_share_pool(self):
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda i: self.database.load_institute(1 + i % 2), range(32)))
+        self.assertEqual(results[::2], [self.database.load_institute(1)] * 16)
+        self.assertLessEqual(self.database.pool.idle.qsize(), 4)
 
-    def get_disciplines_for_group_test(self):
-        pass
 
 if __name__ == '__main__':
     unittest.main()
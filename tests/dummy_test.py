@@ -0,0 +1,68 @@
+import os
+import random
+import tempfile
+import unittest
+from dbconnect import SQLiteBackend, UniversityDatabase, DatabaseError
+from dummy import FictionUniversity
+
+
+class FictionUniversityTestCase(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(handle)
+        self.backend = SQLiteBackend(self.path)
+        self.backend.create_schema()
+        self.fiction = FictionUniversity(self.backend, batch_size=3)
+
+    def tearDown(self):
+        self.fiction.close()
+        os.remove(self.path)
+
+    def test_fill_university(self):
+        random.seed(0)
+        self.fiction.fill_institutes(['Политехнический'])
+        self.fiction.fill_departments({'Политехнический': ['АСОИУ']})
+        self.fiction.fill_positions(['Доцент', 'Профессор'])
+        self.fiction.fill_types(['Лекция', 'Практика'])
+        self.fiction.fill_buildings(['Главное здание', 'Северный корпус'])
+        self.fiction.fill_rooms_in_building(1, floors=(2, 2), rooms=(5, 5))
+        self.fiction.fill_teachers_for_department('АСОИУ', ['Иван'], ['Петрович'], ['Попов'], 10)
+        self.fiction.fill_specialities({'Политехнический': ['ПОВТиАС', 'УИТС']})
+        self.fiction.fill_groups()
+        self.fiction.fill_disciplines_for_speciality('ПОВТиАС', total_semesters=2, per_semester=4)
+        self.fiction.fill_exercises_for_teachers('ПОВТиАС')
+
+        database = UniversityDatabase(self.backend)
+        counts = database.row_counts(['rooms', 'teachers', 'groups', 'disciplines'])
+        self.assertEqual(counts[::2], (10, 10, 2, 8))
+        self.assertEqual([r.name for r in database.get_rooms_in_building(1)][:6],
+                         ['101', '102', '103', '104', '105', '201'])
+        institute = database.load_institute(1)
+        self.assertEqual(len(institute.teachers), 10)
+        self.assertTrue(any(hours for _, hours in institute.teachers))
+        database.close()
+
+        self.fiction.wipe()
+        self.assertEqual(self.fiction.select("select count(*) from rooms"), [(0,)])
+
+    def test_missing_names_raise(self):
+        self.fiction.fill_positions(['Доцент'])
+        self.assertRaises(DatabaseError, self.fiction.fill_teachers_for_department,
+                          'АСОИУ', ['Иван'], ['Петрович'], ['Попов'])
+        self.assertRaises(DatabaseError, self.fiction.fill_disciplines_for_speciality, 'УИТС')
+        self.assertRaises(DatabaseError, self.fiction.fill_exercises_for_teachers, 'УИТС')
+        self.assertEqual(self.fiction.select("select count(*) from teachers"), [(0,)])
+
+    def test_rows_per_statement_fit_sqlite(self):
+        fiction = FictionUniversity(self.backend, batch_size=1000)
+        self.assertEqual(fiction.rows_per_statement(('name',)), 999)
+        self.assertEqual(fiction.rows_per_statement(('a', 'b', 'c', 'd', 'e')), 199)
+        fiction.fill_buildings(['Главное здание'])
+        fiction.fill_types(['Лекция'])
+        fiction.fill_rooms_in_building(1, floors=(10, 10), rooms=(30, 30))
+        self.assertEqual(fiction.select("select count(*) from rooms"), [(300,)])
+        fiction.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
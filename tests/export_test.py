@@ -0,0 +1,95 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from xml.etree import ElementTree
+
+from export import *
+from planner import TIME_SLOTS
+from planner_test import sample_planner
+from synthetic import SyntheticUniversity
+
+TABLE = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+TEXT = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+
+
+def read_ods(filename):
+    ''' {sheet name: rows}, repeated empty cells are expanded '''
+    with zipfile.ZipFile(filename) as archive:
+        assert archive.namelist()[0] == 'mimetype'
+        root = ElementTree.fromstring(archive.read('content.xml'))
+    sheets = {}
+    for table in root.iter(TABLE + 'table'):
+        rows = sheets[table.get(TABLE + 'name')] = []
+        for row in table.iter(TABLE + 'table-row'):
+            values = []
+            for cell in row.iter(TABLE + 'table-cell'):
+                p = cell.find(TEXT + 'p')
+                values += [p.text] if p is not None else [''] * int(
+                    cell.get(TABLE + 'number-columns-repeated', 1))
+            rows.append(values)
+    return sheets
+
+
+class ExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.planner = sample_planner(seed=1)
+        self.planner.create_feasible_timetable()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def expected(self):
+        return {view.name: [view.header] + [row + [''] * (len(view.header) - len(row))
+                                             for row in view.rows]
+                for view in timetable_views(self.planner)}
+
+    def test_formats_keep_the_same_tables(self):
+        expected = self.expected()
+        self.assertEqual(len(expected['groups']), 1 + len(self.planner.groups))
+        lectures = sum(len(g.busy_time) for g in self.planner.groups)
+        for name in ('groups', 'lecturers', 'rooms'):
+            self.assertEqual(sum(1 for row in expected[name][1:] for value in row[1:] if value),
+                             lectures)
+
+        path = os.path.join(self.directory, 'timetable.ods')
+        self.planner.damp_timetable(path)
+        sheets = read_ods(path)
+        self.assertEqual(list(sheets), ['groups', 'lecturers', 'rooms'])
+        for name, rows in sheets.items():
+            self.assertEqual([row + [''] * (len(TIME_SLOTS) + 1 - len(row)) for row in rows],
+                             [[str(v) for v in row] for row in expected[name]])
+
+        path = os.path.join(self.directory, 'timetable.csv')
+        export_timetable(self.planner, path)
+        for name, rows in expected.items():
+            with open(os.path.join(self.directory, 'timetable-{}.csv'.format(name))) as f:
+                self.assertEqual(list(csv.reader(f)), [[str(v) for v in row] for row in rows])
+
+        path = os.path.join(self.directory, 'timetable.json')
+        export_timetable(self.planner, path)
+        with open(path) as f:
+            data = json.load(f)
+        for name, rows in expected.items():
+            header = rows[0]
+            self.assertEqual([[record.get(column, '') for column in header] for record in data[name]],
+                             rows[1:])
+
+        self.assertRaises(ValueError, export_timetable, self.planner, 'timetable.xls')
+
+    def test_large_timetable(self):
+        self.planner = SyntheticUniversity(3000, seed=0).planner(seed=0)
+        self.planner.create_feasible_timetable()
+        path = os.path.join(self.directory, 'timetable.ods')
+        export_timetable(self.planner, path)
+        sheets = read_ods(path)
+        self.assertEqual(len(sheets['groups']), 1 + len(self.planner.groups))
+        self.assertEqual(len(sheets['lecturers']), 1 + len(self.planner.lecturers))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import random
+import unittest
+from genetic import TimetableProblem, genetic_search
+from planner_test import sample_planner
+
+
+class GeneticSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        random.seed(1)
+        self.planner = sample_planner()
+        self.problem = TimetableProblem(self.planner)
+
+    def test_encoding_keeps_timetable(self):
+        seed = self.problem.planner()
+        seed.create_feasible_timetable()
+        individual = self.problem.encode(seed)
+        self.assertEqual(self.problem.fitness(individual), seed.timetable_cost())
+        copy = self.problem.planner()
+        self.problem.decode(individual, copy)
+        groups = {g.id: g.busy_time for g in seed.groups}
+        for g in copy.groups:
+            self.assertEqual(g.busy_time, groups[g.id])
+
+    def test_repair_restores_feasibility(self):
+        seeds = []
+        for _ in range(2):
+            seed = self.problem.planner()
+            seed.create_feasible_timetable()
+            seeds.append(self.problem.encode(seed))
+        for _ in range(20):
+            child = self.problem.crossover(*seeds)
+            self.problem.repair(self.problem.mutate(child, 0.3))
+            planner = self.problem.planner()
+            self.problem.decode(child, planner)
+            self.assertEqual(sum(map(len, planner.taken_rooms)),
+                             sum(len(g.busy_time) for g in planner.groups))
+            for l in planner.lecturers:
+                self.assertEqual(len(l.busy_time),
+                                 sum(1 for slot, i in zip(child.slots, child.lecturers)
+                                     if slot >= 0 and self.problem.lecturer_names[i] == l.name))
+
+    def test_genetic_search(self):
+        cost = genetic_search(self.planner, population_size=30, generations=20, max_workers=1)
+        self.assertEqual(cost, self.planner.timetable_cost())
+        self.assertLess(cost, 100) # nothing left unplanned
+
+    def test_seeded_search_is_reproducible(self):
+        timetables = []
+        for _ in range(2):
+            planner = self.problem.planner()
+            genetic_search(planner, population_size=10, generations=5, max_workers=1, seed=4)
+            timetables.append([g.busy_time for g in planner.groups])
+        self.assertEqual(*timetables)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,76 +1,83 @@
 import unittest
-from planner import TimetablePlanner, Constraint, Lecturer, Group, SubjectType
+from collections import Counter
+from planner import TimetablePlanner, Constraint, Lecturer, Group, SubjectType, RoomIndex
+
+
+def sample_planner(seed=None):
+    ''' Small timetable problem shared by planner tests '''
+    constraints = {
+        'Calculus I': Constraint([304, 306, 311], SubjectType.lecture),
+        'Calculus II': Constraint([304, 306, 311], SubjectType.lecture),
+        'Physics I': Constraint([409, 411], SubjectType.stream_lecture),
+        'Physics II': Constraint([409, 411], SubjectType.stream_lecture),
+        'Circuits': Constraint([501, 502], SubjectType.stream_lecture),
+        'OOP': Constraint([501, 502], SubjectType.stream_lecture),
+        'Software dev.': Constraint([501, 502], SubjectType.stream_lecture),
+        'Compilers': Constraint([501, 502, 503], SubjectType.lecture),
+        'Quantum mech.': Constraint([401, 402],  SubjectType.lecture),
+        'Optics': Constraint([401, 402], SubjectType.lecture),
+        'Theoretical mech.': Constraint([303], SubjectType.lecture)
+    }
+
+    g1281 = Group('12-81', {
+        'Calculus I': 2,
+        'Physics I': 2,
+        'Circuits': 3
+    })
+    g1282 = Group('12-82', {
+        'Calculus I': 3,
+        'Physics I': 2,
+        'Circuits': 2
+    })
+    g1283 = Group('12-83', {
+        'Calculus I': 2,
+        'Physics I': 3,
+        'Circuits': 2
+    })
+    g1291 = Group('12-91', {
+        'Calculus II': 2,
+        'Physics II': 3,
+        'OOP': 3,
+        'Software dev.': 3,
+        'Theoretical mech.': 4
+    })
+    g1292 = Group('12-92', {
+        'Calculus II': 2,
+        'Physics II': 3,
+        'OOP': 3,
+        'Software dev.': 3,
+        'Compilers': 4
+    })
+    g1293 = Group('12-93', {
+        'Calculus II': 2,
+        'Physics II': 3,
+        'Quantum mech.': 2,
+        'Optics': 3
+    })
+
+    smith = Lecturer('Prof. Smith',  ['Calculus I', 'Calculus II', 'Theoretical mech.'])
+    jones = Lecturer('PhD. Jones', ['Calculus I'])
+    fisher = Lecturer('Prof. Fisher', ['Physics I', 'Physics II', 'Optics'])
+    stone = Lecturer('Dr. Stone', ['Calculus I', 'Calculus II'])
+    fry = Lecturer('PhD. Fry', ['Physics I', 'Physics II'])
+    holmes = Lecturer('Dr. Holmes', ['OOP', 'Software dev.', 'Compilers'])
+    backer = Lecturer('PhD. Backer', ['OOP'])
+    drake = Lecturer('Prof. Drake', ['Physics I', 'Physics II', 'Quantum mech.'])
+    gnome = Lecturer('Dr. Gnome', ['Calculus I', 'Calculus II'])
+    forest = Lecturer('Prof. Forest', ['Circuits'])
+
+    return TimetablePlanner(
+        constraints, # are relative to subjects
+        [g1281, g1282, g1283, g1291, g1292, g1293], # academic groups
+        [smith, jones, fisher, stone, fry,          # lecturers
+         holmes, backer, drake, gnome, forest],
+        seed
+    )
 
 
 class TimetablePlannerTestCase(unittest.TestCase):
     def setUp(self):
-        constraints = {
-            'Calculus I': Constraint([304, 306, 311], SubjectType.lecture),
-            'Calculus II': Constraint([304, 306, 311], SubjectType.lecture),
-            'Physics I': Constraint([409, 411], SubjectType.stream_lecture),
-            'Physics II': Constraint([409, 411], SubjectType.stream_lecture),
-            'Circuits': Constraint([501, 502], SubjectType.stream_lecture),
-            'OOP': Constraint([501, 502], SubjectType.stream_lecture),
-            'Software dev.': Constraint([501, 502], SubjectType.stream_lecture),
-            'Compilers': Constraint([501, 502, 503], SubjectType.lecture),
-            'Quantum mech.': Constraint([401, 402],  SubjectType.lecture),
-            'Optics': Constraint([401, 402], SubjectType.lecture),
-            'Theoretical mech.': Constraint([303], SubjectType.lecture)
-        }
-
-        g1281 = Group('12-81', {
-            'Calculus I': 2,
-            'Physics I': 2,
-            'Circuits': 3
-        })
-        g1282 = Group('12-82', {
-            'Calculus I': 3,
-            'Physics I': 2,
-            'Circuits': 2
-        })
-        g1283 = Group('12-83', {
-            'Calculus I': 2,
-            'Physics I': 3,
-            'Circuits': 2
-        })
-        g1291 = Group('12-91', {
-            'Calculus II': 2,
-            'Physics II': 3,
-            'OOP': 3,
-            'Software dev.': 3,
-            'Theoretical mech.': 4
-        })
-        g1292 = Group('12-92', {
-            'Calculus II': 2,
-            'Physics II': 3,
-            'OOP': 3,
-            'Software dev.': 3,
-            'Compilers': 4
-        })
-        g1293 = Group('12-93', {
-            'Calculus II': 2,
-            'Physics II': 3,
-            'Quantum mech.': 2,
-            'Optics': 3
-        })
-
-        smith = Lecturer('Prof. Smith',  ['Calculus I', 'Calculus II', 'Theoretical mech.'])
-        jones = Lecturer('PhD. Jones', ['Calculus I'])
-        fisher = Lecturer('Prof. Fisher', ['Physics I', 'Physics II', 'Optics'])
-        stone = Lecturer('Dr. Stone', ['Calculus I', 'Calculus II'])
-        fry = Lecturer('PhD. Fry', ['Physics I', 'Physics II'])
-        holmes = Lecturer('Dr. Holmes', ['OOP', 'Software dev.', 'Compilers'])
-        backer = Lecturer('PhD. Backer', ['OOP'])
-        drake = Lecturer('Prof. Drake', ['Physics I', 'Physics II', 'Quantum mech.'])
-        gnome = Lecturer('Dr. Gnome', ['Calculus I', 'Calculus II'])
-        forest = Lecturer('Prof. Forest', ['Circuits'])
-
-        self.planner = TimetablePlanner(
-            constraints, # are relative to subjects
-            [g1281, g1282, g1283, g1291, g1292, g1293], # academic groups
-            [smith, jones, fisher, stone, fry,          # lecturers
-             holmes, backer, drake, gnome, forest]
-        )
+        self.planner = sample_planner()
 
     def test_create_feasible_timetable(self):
         self.planner.create_feasible_timetable()
@@ -78,6 +85,92 @@ class TimetablePlannerTestCase(unittest.TestCase):
         self.assertEquals(
             sum([sum(g.unplanned_lectures.values()) for g in self.planner.groups]), 0)
 
+    def test_seeded_planner_is_reproducible(self):
+        timetables = []
+        for _ in range(2):
+            planner = sample_planner(seed=7)
+            names = [g.id for g in planner.groups]
+            planner.create_feasible_timetable()
+            planner.find_optimal_timetable(time_limit=None, max_steps=500)
+            self.assertEqual([g.id for g in planner.groups], names)
+            timetables.append([g.busy_time for g in planner.groups])
+        self.assertEqual(*timetables)
+
+    def test_occupancy(self):
+        group = Group('12-81', {'Calculus I': 2})
+        group.fill_slot(('TUE', '2nd'), 'Calculus I', 'Prof. Smith', 304)
+        group.fill_slot(('TUE', '4th'), 'Calculus I', 'Prof. Smith', 304)
+        self.assertTrue(group.is_busy(('TUE', '2nd')))
+        self.assertEqual(group.lecture_quantity('TUE'), 2)
+        self.assertEqual(group.day_hours('TUE'), [1, 3])
+        group.free_slot(('TUE', '2nd'))
+        self.assertFalse(group.is_busy(('TUE', '2nd')))
+        self.assertEqual(group.lecture_quantity('TUE'), 1)
+        self.assertTrue(group.is_empty_day('MON'))
+
+    def test_room_index(self):
+        index = RoomIndex({'OOP': [501, 502], 'Circuits': [501, 502], 'Compilers': [501, 503]}, 2)
+        self.assertEqual(len(index.pool_rooms), 2)
+        self.assertEqual(set(index.free_rooms('OOP', 0)), {501, 502})
+        index.take(501, 0)
+        self.assertEqual(list(index.free_rooms('Circuits', 0)), [502])
+        self.assertEqual(list(index.free_rooms('Compilers', 0)), [503])
+        self.assertEqual(set(index.free_rooms('Compilers', 1)), {501, 503})
+        index.take(502, 0)
+        self.assertIsNone(index.random_free('OOP', 0))
+        index.release(501, 0)
+        self.assertEqual(index.random_free('OOP', 0), 501)
+        self.assertEqual(set(index.free_rooms('Compilers', 0)), {501, 503})
+
+    def test_find_optimal_timetable(self):
+        self.planner = sample_planner(seed=3)
+        self.planner.create_feasible_timetable()
+        initial = self.planner.timetable_cost()
+        cost = self.planner.find_optimal_timetable(time_limit=5, max_steps=3000)
+        self.assertEqual(cost, self.planner.timetable_cost())
+        self.assertLess(cost, initial)
+        # hard constraints still hold
+        lectures = Counter()
+        for g in self.planner.groups:
+            for slot, (subject, name, room) in g.busy_time.items():
+                lecturer = self.planner.lecturer_by_name[name]
+                self.assertEqual(lecturer.busy_time[slot], (subject, g.id, room))
+                self.assertIn(room, self.planner.constraints[subject].rooms)
+                lectures[g.id, subject] += 1
+            for day in TimetablePlanner.WEEK:
+                self.assertLessEqual(g.lecture_quantity(day), TimetablePlanner.MAX_DAY_LECTURES)
+        # every lecture took its own room
+        self.assertEqual(sum(map(len, self.planner.taken_rooms)), sum(lectures.values()))
+        self.assertEqual(sum(lectures.values()),
+                         sum(len(l.busy_time) for l in self.planner.lecturers))
+
+    def test_warm_search_returns_cost_of_timetable(self):
+        for seed in range(10): # uphill moves from the best timetable are accepted
+            planner = sample_planner(seed=seed)
+            cost = planner.find_optimal_timetable(time_limit=None, max_steps=300,
+                                                  temperature=(50.0, 20.0))
+            self.assertEqual(cost, planner.timetable_cost())
+
+    def test_find_optimal_timetable_needs_limit(self):
+        self.assertRaises(ValueError, self.planner.find_optimal_timetable, time_limit=None)
+
+
+    def test_repair_timetable(self):
+        planner = sample_planner(seed=5)
+        planner.create_feasible_timetable()
+        before = {g.id: dict(g.busy_time) for g in planner.groups}
+        unplanned = planner.repair_timetable(closed_rooms={501}, absent_lecturers={'Dr. Stone'})
+        self.assertEqual(unplanned, 0)
+        self.assertNotIn('Dr. Stone', [l.name for l in planner.lecturers])
+        for g in planner.groups:
+            for slot, (subject, name, room) in g.busy_time.items():
+                self.assertNotEqual(room, 501)
+                self.assertEqual(planner.lecturer_by_name[name].busy_time[slot], (subject, g.id, room))
+            disrupted = any(name == 'Dr. Stone' or room == 501
+                            for _, name, room in before[g.id].values())
+            if not disrupted: # other groups keep their timetables
+                self.assertEqual(g.busy_time, before[g.id])
+        self.assertTrue(all(501 in rooms for rooms in planner.taken_rooms))
 
 if __name__ == '__main__':
     unittest.main()
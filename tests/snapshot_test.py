@@ -0,0 +1,55 @@
+import shutil
+import tempfile
+import unittest
+from collections import namedtuple
+from snapshot import SnapshotCache, load_dataset
+
+
+ConnData = namedtuple('ConnData', ['host', 'user', 'password', 'dbname'])
+
+
+class MemoryDatabase:
+    ''' Just enough of UniversityDatabase for snapshots '''
+    def __init__(self):
+        self.data = ConnData('localhost', 'work', '123', 'univercity')
+        self.rows = 1
+        self.loads = 0
+
+    def row_counts(self, tables):
+        return (self.rows,) * len(tables)
+
+    def load_institute(self, inst_id, semesters):
+        self.loads += 1
+        return {('g', inst_id): [(1, 'Calculus')] * self.rows}, [('teacher', {})]
+
+    def get_rooms_in_building(self, building_id):
+        return [(building_id, '101', 1, 20)]
+
+
+class SnapshotCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SnapshotCache(self.directory)
+        self.database = MemoryDatabase()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_snapshot_is_reused_until_database_changes(self):
+        first = load_dataset(self.database, 1, (4,), (3,), self.cache)
+        self.assertEqual(load_dataset(self.database, 1, (4,), (3,), self.cache), first)
+        self.assertEqual(self.database.loads, 1)
+        self.assertEqual(first.rooms, {4: [(4, '101', 1, 20)]})
+
+        load_dataset(self.database, 1, (4,), (3, 5), self.cache) # other key
+        self.assertEqual(self.database.loads, 2)
+
+        self.database.rows = 2
+        self.assertEqual(load_dataset(self.database, 1, (4,), (3,), self.cache, check=False), first)
+        second = load_dataset(self.database, 1, (4,), (3,), self.cache)
+        self.assertEqual(self.database.loads, 3)
+        self.assertNotEqual(second, first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from synthetic import SyntheticUniversity
+
+
+class SyntheticUniversityTestCase(unittest.TestCase):
+    def test_size_and_reproducibility(self):
+        for lectures in (10, 777):
+            university = SyntheticUniversity(lectures, seed=3)
+            self.assertEqual(len(university), lectures)
+            self.assertEqual(len(university.csp().variables), lectures)
+            again = SyntheticUniversity(lectures, seed=3)
+            self.assertEqual(again.teachers, university.teachers)
+            self.assertEqual(again.room_domains, university.room_domains)
+
+    def test_planner_inputs(self):
+        university = SyntheticUniversity(2000, seed=5)
+        planner = university.planner(seed=1)
+        for g in planner.groups: # fits into the week
+            self.assertLessEqual(sum(g.unplanned_lectures.values()), 24)
+        planner.create_feasible_timetable()
+        self.assertEqual(sum(sum(g.unplanned_lectures.values()) for g in planner.groups), 0)
+
+    def test_csp_inputs(self):
+        csp = SyntheticUniversity(200, seed=7).csp()
+        csp.setup_constraints()
+        for X in csp.variables:
+            self.assertTrue(X.listeners)
+            self.assertTrue(all(csp.constraint_kind(X, Y) for Y in X.neighbors))
+
+
+if __name__ == '__main__':
+    unittest.main()
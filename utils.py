@@ -20,9 +20,14 @@ def every(predicate, seq):
 
 def argmin(function, X, tiesolve=None):
     """ Returns element x from X which minimizes function value """
-    X = [(x, function(x)) for x in sorted(X, key=function)]
-    X = [x for x, y in itertools.takewhile(lambda pair: pair[1] == X[0][1], X)]
-    return tiesolve(X) if tiesolve is not None else X
+    best, least = [], None
+    for x in X:
+        value = function(x)
+        if not best or value < least:
+            best, least = [x], value
+        elif value == least:
+            best.append(x)
+    return tiesolve(best) if tiesolve is not None else best
 
 
 def argmax(function, X, tiesolve=None):
@@ -33,4 +38,42 @@ def argmax(function, X, tiesolve=None):
 def bounded_sum(seq, K=INFINITY):
     """ Вычисляет сумму, ограниченную диапазоном [0; K] """
     acc = sum(map(abs, seq))
-    return acc if acc < K else K
\ No newline at end of file
+    return acc if acc < K else K
+
+class IndexedSet:
+    """ Set with O(1) add, discard and access by position, so random.choice
+        could be applied to it directly. Items are distinguished by key(item),
+        variables are compared by identity because of their value-based __eq__ """
+    def __init__(self, items=(), key=id):
+        self.key = key
+        self.items = []
+        self.positions = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        k = self.key(item)
+        if k not in self.positions:
+            self.positions[k] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        i = self.positions.pop(self.key(item), None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.positions[self.key(last)] = i
+
+    def __contains__(self, item):
+        return self.key(item) in self.positions
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)